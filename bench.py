@@ -0,0 +1,347 @@
+"""
+Synthetic fleet benchmarks for the generation pipeline.
+
+Builds a settings workbook shaped like the XFMR_487E sheet (class_487E/settings_487E
+tables) and an RDB template directory, both from a seed, then times the three stages
+separately:
+    get_wordbits       word bit resolution for every relay (compile_settings included)
+    process_rdb_files  in-place rewrite of a copied template directory per relay
+    gen_settings       end to end: workbook read, word bits, render and write
+
+No Excel install is needed: the workbook is written as a plain .xlsx package and read
+back through the pure-Python reader. Results are printed (or written with --output) as
+one JSON document so runs can be compared across commits.
+
+Example:
+    python bench.py --relays 500 --settings-rows 5000 --files 16 --lines 600 --repeat 3
+    python bench.py --workers 0 --engine matrix --output bench_output.txt
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from rdb import (DEVICE_CONFIGS, RELAY_TYPES, compile_settings, gen_settings, get_wordbits, process_rdb_files,
+                 read_relay_tables)
+from workbook import open_workbook
+
+BENCH_TYPE = 'xfmr_487E'
+SETTINGS_HEADER = ['Element', 'Value', 'Description', 'Type', 'Range', 'Settings Class', 'Logic Class', 'Notes',
+                   'Group', 'Float']
+CLASS_HEADER = ['RID', 'Settings Class', 'Logic Class', 'IP Address']
+# Settings groups in the order template files are created (SET_1.TXT, SET_2.TXT, ..., SET_D1.TXT, SET_F1.TXT, ...)
+TEMPLATE_GROUPS = ['1', '2', '3', '4', '5', '6', 'D1', 'F1', 'L1', 'L2', 'L3', 'L4', 'L5', 'L6',
+                   'A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8', 'A9', 'A10']
+
+XLSX_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+OFFICE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+SPREADSHEET_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+
+
+# --- Synthetic inputs ---
+def column_letter(index):
+    """1 -> 'A', 27 -> 'AA'"""
+    letters = ''
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def write_xlsx(xl_path, sheet_name, tables):
+    """
+    Writes a minimal single-sheet .xlsx package holding Excel tables. The package declares its content
+    types and table columns, so openpyxl and Excel (the xlwings backend) open it as well.
+
+    Args:
+        tables (list): [(table name, first column number, rows incl. header), ...], all starting on row 1
+    """
+    strings = {}
+    cells = {}
+    for _, first_col, rows in tables:
+        for r, row in enumerate(rows, 1):
+            for c, value in enumerate(row, first_col):
+                cells.setdefault(r, []).append((c, value))
+
+    sheet = [f'<worksheet xmlns="{XLSX_NS}" xmlns:r="{OFFICE_REL}"><sheetData>']
+    for r in sorted(cells):
+        sheet.append(f'<row r="{r}">')
+        for c, value in sorted(cells[r], key=lambda cell: cell[0]):
+            ref = f'{column_letter(c)}{r}'
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                sheet.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float)):
+                sheet.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                sheet.append(f'<c r="{ref}" t="s"><v>{strings.setdefault(str(value), len(strings))}</v></c>')
+        sheet.append('</row>')
+    sheet.append('</sheetData><tableParts>')
+    sheet.extend(f'<tablePart r:id="rId{i}"/>' for i in range(1, len(tables) + 1))
+    sheet.append('</tableParts></worksheet>')
+
+    with zipfile.ZipFile(xl_path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        content_types = [
+            f'<Types xmlns="{CONTENT_TYPES_NS}">',
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>',
+            '<Default Extension="xml" ContentType="application/xml"/>',
+            f'<Override PartName="/xl/workbook.xml" ContentType="{SPREADSHEET_TYPE}.sheet.main+xml"/>',
+            f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{SPREADSHEET_TYPE}.worksheet+xml"/>',
+            f'<Override PartName="/xl/sharedStrings.xml" ContentType="{SPREADSHEET_TYPE}.sharedStrings+xml"/>']
+        content_types.extend(f'<Override PartName="/xl/tables/table{i}.xml" '
+                             f'ContentType="{SPREADSHEET_TYPE}.table+xml"/>' for i in range(1, len(tables) + 1))
+        content_types.append('</Types>')
+        z.writestr('[Content_Types].xml', ''.join(content_types))
+        z.writestr('_rels/.rels', f'<Relationships xmlns="{REL_NS}"><Relationship Id="rId1" '
+                                  f'Type="{OFFICE_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+        z.writestr('xl/workbook.xml', f'<workbook xmlns="{XLSX_NS}" xmlns:r="{OFFICE_REL}"><sheets>'
+                                      f'<sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        z.writestr('xl/_rels/workbook.xml.rels', f'<Relationships xmlns="{REL_NS}"><Relationship Id="rId1" '
+                                                 f'Type="{OFFICE_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+                                                 f'<Relationship Id="rId2" Type="{OFFICE_REL}/sharedStrings" '
+                                                 f'Target="sharedStrings.xml"/></Relationships>')
+        z.writestr('xl/worksheets/sheet1.xml', ''.join(sheet))
+        sheet_rels = [f'<Relationships xmlns="{REL_NS}">']
+        for i, (table_name, first_col, rows) in enumerate(tables, 1):
+            ref = f'{column_letter(first_col)}1:{column_letter(first_col + len(rows[0]) - 1)}{len(rows)}'
+            columns = ''.join(f'<tableColumn id="{c}" name="{escape(str(name))}"/>'
+                              for c, name in enumerate(rows[0], 1))
+            z.writestr(f'xl/tables/table{i}.xml', f'<table xmlns="{XLSX_NS}" id="{i}" name="{table_name}" '
+                                                  f'displayName="{table_name}" ref="{ref}"><autoFilter ref="{ref}"/>'
+                                                  f'<tableColumns count="{len(rows[0])}">{columns}</tableColumns>'
+                                                  f'</table>')
+            sheet_rels.append(f'<Relationship Id="rId{i}" Type="{OFFICE_REL}/table" Target="../tables/table{i}.xml"/>')
+        sheet_rels.append('</Relationships>')
+        z.writestr('xl/worksheets/_rels/sheet1.xml.rels', ''.join(sheet_rels))
+        z.writestr('xl/sharedStrings.xml', f'<sst xmlns="{XLSX_NS}">' +
+                   ''.join(f'<si><t>{escape(s)}</t></si>' for s in strings) + '</sst>')
+
+
+def make_tables(relays, settings_rows, settings_classes, logic_classes, logic_fanout, float_ratio, elements, groups,
+                seed=0):
+    """
+    Builds class and settings tables (header row first) shaped like class_487E/settings_487E.
+
+    Args:
+        relays (int): class table rows
+        settings_rows (int): settings table rows
+        settings_classes (int): distinct settings classes (S1, S2, ...)
+        logic_classes (int): distinct logic classes (1, 2, ...)
+        logic_fanout (int): most logic classes listed on one settings row ('1, 4, 7')
+        float_ratio (float): share of numeric values flagged in the Float column
+        elements (list): element names to draw from (the template's)
+        groups (list): settings groups to draw from (the template's)
+    """
+    rng = random.Random(seed)
+    class_table = [CLASS_HEADER]
+    for i in range(relays):
+        class_table.append([f'XFMR{i:05d}', f'S{rng.randint(1, settings_classes)}',
+                            float(rng.randint(1, logic_classes)), f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'])
+
+    settings_table = [SETTINGS_HEADER]
+    for i in range(settings_rows):
+        set_class = f'S{rng.randint(1, settings_classes)}' if rng.random() < 0.5 else None
+        logic_class = None
+        if rng.random() < 0.5:
+            tokens = rng.sample(range(1, logic_classes + 1), rng.randint(1, min(logic_fanout, logic_classes)))
+            logic_class = float(tokens[0]) if len(tokens) == 1 else ', '.join(str(t) for t in tokens)
+        is_float = rng.random() < float_ratio
+        if is_float:
+            value = round(rng.uniform(0, 100), 3)
+        elif rng.random() < 0.5:
+            value = float(rng.randint(0, 100))
+        else:
+            value = rng.choice(['OFF', 'ON', 'Y', 'N', 'IN101 AND NOT PB1', '50P1T OR 51S1T'])
+        group = rng.choice(groups) if rng.random() < 0.7 else None
+        settings_table.append([rng.choice(elements), value, f'Setting {i}', None, None, set_class, logic_class, None,
+                               float(group) if group is not None and group.isdigit() else group, is_float])
+    return class_table, settings_table
+
+
+def make_template(template_path, files, lines_per_file, seed=0):
+    """
+    Writes a synthetic RDB template directory (SET_1.TXT, ..., SET_D1.TXT, SET_F1.TXT, ...) plus a
+    non-settings file, and returns (element names, settings groups) for make_tables.
+    """
+    if files > len(TEMPLATE_GROUPS):
+        raise ValueError(f"At most {len(TEMPLATE_GROUPS)} template files are supported")
+    rng = random.Random(seed)
+    groups = TEMPLATE_GROUPS[:files]
+    elements = [f'E{k:04d}' for k in range(lines_per_file)]
+    os.makedirs(template_path, exist_ok=True)
+    for group in groups:
+        with open(os.path.join(template_path, f'SET_{group}.TXT'), 'w', encoding='ascii') as f:
+            f.write(f'[{group}]\n')
+            if group == '1':
+                f.write('RID,"XFMR"\x1cRelay ID\nIPADDR,"0.0.0.0"\x1cIP Address\nPMSTN,"XFMR"\x1cPhasor ID\n')
+            if group == 'F1':
+                f.write('DP_NAM01,"NAME"\x1c\nDP_SIZE01,"1"\x1c\n')
+            for element in elements:
+                f.write(f'{element},"{rng.randint(0, 999)}"\x1c\n')
+    with open(os.path.join(template_path, 'SET_ALL.CFG'), 'w', encoding='ascii') as f:
+        f.write('[INFO]\nRELAYTYPE=487E\n')
+    return elements, groups
+
+
+def build_inputs(root, args):
+    """Writes the template directory and workbook under root; returns (xl_path, template_path)"""
+    template_path = os.path.join(root, 'template')
+    elements, groups = make_template(template_path, args.files, args.lines, seed=args.seed)
+    class_table, settings_table = make_tables(args.relays, args.settings_rows, args.settings_classes,
+                                              args.logic_classes, args.logic_fanout, args.float_ratio, elements,
+                                              groups, seed=args.seed)
+    params = RELAY_TYPES[BENCH_TYPE]['params']
+    xl_path = os.path.join(root, 'settings.xlsx')
+    write_xlsx(xl_path, params['sheet_name'], [(params['class_table'], 1, class_table),
+                                               (params['settings_table'], len(CLASS_HEADER) + 2, settings_table)])
+    return xl_path, template_path
+
+
+# --- Benchmarks ---
+def time_runs(func, repeat, setup=None):
+    """Runs func repeat times (after setup, which is not timed) and returns the durations in seconds"""
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_wordbits(relays, settings, repeat):
+    def run():
+        settings_index = compile_settings(settings)
+        for relay in relays:
+            get_wordbits(relay, settings, settings_index=settings_index)
+    return time_runs(run, repeat)
+
+
+def bench_process_rdb_files(relays, settings, template_path, work_dir, repeat):
+    settings_index = compile_settings(settings)
+    word_bits = [get_wordbits(relay, settings, settings_index=settings_index) for relay in relays]
+    targets = [os.path.join(work_dir, str(relay[0])) for relay in relays]
+    config = DEVICE_CONFIGS['SERIES_400']
+
+    def setup():
+        shutil.rmtree(work_dir, ignore_errors=True)
+        for target in targets:
+            shutil.copytree(template_path, target)
+
+    def run():
+        for target, bits in zip(targets, word_bits):
+            process_rdb_files(target, bits, None, config)
+    return time_runs(run, repeat, setup)
+
+
+def bench_gen_settings(xl_path, template_path, output_path, repeat, engine, workers):
+    def setup():
+        shutil.rmtree(output_path, ignore_errors=True)
+
+    def run():
+        # The per-relay progress prints would dominate small runs; they are not part of the measurement
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            gen_settings(xl_path, template_path, output_path, RELAY_TYPES[BENCH_TYPE]['params'], engine=engine,
+                         workers=workers)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return time_runs(run, repeat, setup)
+
+
+def summarise(name, durations, relays, **extra):
+    result = {'benchmark': name, 'runs': durations, 'best': min(durations), 'mean': sum(durations) / len(durations),
+              'relays_per_second': relays / min(durations) if min(durations) else None}
+    result.update(extra)
+    return result
+
+
+def run_benchmarks(args, root):
+    xl_path, template_path = build_inputs(root, args)
+    wb = open_workbook(xl_path)
+    try:
+        relay_class_rng, settings_rng = read_relay_tables(wb, RELAY_TYPES[BENCH_TYPE]['params'])
+    finally:
+        wb.close()
+    relays = [row for row in relay_class_rng[1:] if row[0] is not None]
+
+    selected = args.only.split(',') if args.only else ['get_wordbits', 'process_rdb_files', 'gen_settings']
+    results = []
+    if 'get_wordbits' in selected:
+        results.append(summarise('get_wordbits', bench_wordbits(relays, settings_rng, args.repeat), len(relays)))
+    if 'process_rdb_files' in selected:
+        durations = bench_process_rdb_files(relays, settings_rng, template_path, os.path.join(root, 'inplace'),
+                                            args.repeat)
+        results.append(summarise('process_rdb_files', durations, len(relays)))
+    if 'gen_settings' in selected:
+        durations = bench_gen_settings(xl_path, template_path, os.path.join(root, 'output'), args.repeat,
+                                       args.engine, args.workers or None)
+        results.append(summarise('gen_settings', durations, len(relays), engine=args.engine,
+                                 workers=args.workers or os.cpu_count()))
+
+    return {
+        'params': {key: getattr(args, key) for key in ('relays', 'settings_rows', 'settings_classes', 'logic_classes',
+                                                       'logic_fanout', 'float_ratio', 'files', 'lines', 'seed',
+                                                       'repeat')},
+        'inputs': {'workbook_bytes': os.path.getsize(xl_path),
+                   'template_bytes': sum(os.path.getsize(os.path.join(template_path, name))
+                                         for name in os.listdir(template_path))},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count()},
+        'results': results,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark RDB generation on a synthetic 487E fleet.")
+    parser.add_argument('--relays', type=int, default=200, help="class table rows")
+    parser.add_argument('--settings-rows', type=int, default=2000, help="settings table rows")
+    parser.add_argument('--settings-classes', type=int, default=4, help="distinct settings classes")
+    parser.add_argument('--logic-classes', type=int, default=8, help="distinct logic classes")
+    parser.add_argument('--logic-fanout', type=int, default=3, help="most logic classes on one settings row")
+    parser.add_argument('--float-ratio', type=float, default=0.3, help="share of rows flagged Float")
+    parser.add_argument('--files', type=int, default=12, help="settings files in the template")
+    parser.add_argument('--lines', type=int, default=400, help="element lines per settings file")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the synthetic inputs")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument('--engine', choices=['index', 'matrix'], default='index', help="gen_settings word bit engine")
+    parser.add_argument('--workers', type=int, default=1, help="gen_settings process pool size (0 = all cores)")
+    parser.add_argument('--only', help="comma separated subset: get_wordbits,process_rdb_files,gen_settings")
+    parser.add_argument('--keep', metavar='DIR', help="build inputs and outputs in DIR and keep them")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+        report = run_benchmarks(args, args.keep)
+    else:
+        with tempfile.TemporaryDirectory(prefix='rdb_bench_') as root:
+            report = run_benchmarks(args, root)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Headless batch generation for every relay type in one settings workbook.
+
+The workbook is opened once and each relay type's class/settings tables are read
+in a single pass, then every type with a template is generated in this process.
+Relay types are the keys of rdb.RELAY_TYPES (the same ones the GUI offers).
+
+Example:
+    python cli.py Settings.xlsx C:\\Output --template feeder=C:\\Templates\\351S --template xfmr_487E=C:\\Templates\\487E
+    python cli.py Settings.xlsx /srv/rdb --templates templates.json --exclude feeder=5,6,L5,L6 --workers 8
+
+templates.json maps relay type to template directory: {"feeder": "templates/351S", "hv": "templates/351S"}
+Each relay type is written to <output root>/<relay type>.
+"""
+import argparse
+import json
+import os
+import sys
+
+from delta import check_previous_path
+from profiling import profile_generation
+from rdb import OUTPUT_MODES, RELAY_TYPES, gen_settings, open_relay_workbook, read_relay_tables, stream_settings
+from settings_store import import_workbook
+from table_cache import DEFAULT_CACHE_DIR
+from workbook import BACKENDS
+
+
+def parse_mapping(values, option):
+    """['feeder=C:\\T', ...] -> {'feeder': 'C:\\T', ...}"""
+    mapping = {}
+    for value in values or []:
+        key, sep, target = value.partition('=')
+        if not sep or not key or not target:
+            raise argparse.ArgumentTypeError(f"{option} expects TYPE=VALUE, got '{value}'")
+        mapping[key.strip()] = target.strip()
+    return mapping
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate SEL RDB settings for every relay type in a workbook.")
+    parser.add_argument('workbook', help="settings workbook (.xlsx/.xlsm, or .xls through Excel)")
+    parser.add_argument('output_root', help="output root; each relay type is written to <output_root>/<type>")
+    parser.add_argument('--template', action='append', metavar='TYPE=DIR',
+                        help="RDB template directory for a relay type (repeatable)")
+    parser.add_argument('--templates', metavar='JSON', help="JSON file mapping relay type to template directory")
+    parser.add_argument('--types', help="comma separated relay types to generate (default: every type with a template)")
+    parser.add_argument('--exclude', action='append', metavar='TYPE=GROUPS',
+                        help="settings groups to leave untouched for a type, e.g. feeder=5,6,L5 (repeatable)")
+    parser.add_argument('--no-comments', action='store_true', help="omit comments from the RDB files")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), help="workbook reader (default: by file extension)")
+    parser.add_argument('--table-cache', metavar='DIR', nargs='?', const=DEFAULT_CACHE_DIR,
+                        help="cache decoded workbook tables in DIR (default: %(const)s) so later runs against "
+                             "the same workbook skip reading it")
+    parser.add_argument('--engine', choices=['index', 'matrix', 'sqlite'], default='index', help="word bit engine")
+    parser.add_argument('--settings-db', metavar='DB',
+                        help="settings store for --engine sqlite; the workbook is imported into it first "
+                             "(sheets unchanged since the last import are kept)")
+    parser.add_argument('--relay', action='append', metavar='RID',
+                        help="generate only this relay (repeatable); other relays' output is left alone "
+                             "(not with --output-mode fleet_zip)")
+    parser.add_argument('--workers', type=int, default=1, help="process pool size per relay type (0 = all cores)")
+    parser.add_argument('--io-workers', type=int, default=1,
+                        help="with --workers 1, render this many relays at once on threads to overlap file I/O "
+                             "(e.g. on network shares)")
+    parser.add_argument('--incremental', action='store_true', help="skip relays unchanged since the last run")
+    parser.add_argument('--hardlink', action='store_true', help="hardlink unchanged files to the template")
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default='directory', help="output layout")
+    parser.add_argument('--previous', metavar='ROOT',
+                        help="previous output root to compare against with --output-mode delta "
+                             "(each type is compared with <ROOT>/<type>)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="render every relay in memory and report lines replaced/cleared, bytes and unmatched "
+                             "word bits without writing anything")
+    parser.add_argument('--streaming', action='store_true',
+                        help="read, render and write one relay at a time so memory stays flat on very large "
+                             "fleets (index engine, one worker)")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile each relay type (CPU hotspots and peak memory per phase); "
+                             "the report is saved in that type's output folder")
+    return parser
+
+
+def run_streaming(args, relay_types, templates, exclusions):
+    """Generates each relay type with rdb.stream_settings; only a running count is kept per type"""
+    failures = {}
+    for key in relay_types:
+        print(f"=== {RELAY_TYPES[key]['label']} ===")
+        relays = skipped = 0
+        failed = []
+        try:
+            for result in stream_settings(
+                    xl_path=args.workbook,
+                    template_path=templates[key],
+                    output_path=os.path.join(args.output_root, key),
+                    workbook_params=RELAY_TYPES[key]['params'],
+                    excluded_regions=exclusions.get(key),
+                    include_comments=not args.no_comments,
+                    backend=args.backend,
+                    table_cache=args.table_cache,
+                    incremental=args.incremental,
+                    hardlink=args.hardlink,
+                    output_mode=args.output_mode):
+                relays += 1
+                skipped += result['skipped']
+                if result['error']:
+                    failed.append(f"{result['relay']}: {result['error']}")
+            print(f"{RELAY_TYPES[key]['label']}: {relays} relays ({skipped} unchanged)")
+            if failed:
+                failures[key] = f"Settings generation failed for {len(failed)} relay(s): {'; '.join(failed)}"
+        except Exception as e:
+            failures[key] = str(e)
+
+    for key, error in failures.items():
+        print(f"{RELAY_TYPES[key]['label']} failed: {error}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        templates = {}
+        if args.templates:
+            with open(args.templates, 'r', encoding='utf-8') as f:
+                templates.update(json.load(f))
+        templates.update(parse_mapping(args.template, '--template'))
+        exclusions = {key: [g.strip() for g in groups.split(',') if g.strip()]
+                      for key, groups in parse_mapping(args.exclude, '--exclude').items()}
+    except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+
+    relay_types = args.types.split(',') if args.types else [key for key in RELAY_TYPES if key in templates]
+    unknown = [key for key in list(relay_types) + list(templates) if key not in RELAY_TYPES]
+    if unknown:
+        parser.error(f"Unknown relay type(s): {', '.join(sorted(set(unknown)))}. "
+                     f"Choose from: {', '.join(RELAY_TYPES)}")
+    missing = [key for key in relay_types if key not in templates]
+    if missing:
+        parser.error(f"No template directory given for: {', '.join(missing)}")
+    if not relay_types:
+        parser.error("Nothing to generate: give at least one --template or --templates")
+    if (args.output_mode == 'delta') != bool(args.previous):
+        parser.error("--output-mode delta and --previous go together")
+    if args.previous:
+        try:
+            check_previous_path(args.output_root, args.previous)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.relay and args.output_mode == 'fleet_zip' and not args.dry_run:
+        parser.error("--relay cannot be used with --output-mode fleet_zip: the archive is rewritten whole")
+    if args.streaming and (args.engine != 'index' or args.workers != 1 or args.profile or args.relay
+                           or args.dry_run):
+        parser.error("--streaming runs the index engine in one worker over the whole fleet and cannot be profiled")
+    if (args.engine == 'sqlite') != bool(args.settings_db):
+        parser.error("--engine sqlite and --settings-db go together")
+
+    if args.streaming:
+        return run_streaming(args, relay_types, templates, exclusions)
+
+    # 1. Read every relay type's tables with a single workbook open (or refresh the settings store)
+    failures = {}
+    tables = {}
+    if args.engine == 'sqlite':
+        import_workbook(args.settings_db, args.workbook, relay_types, args.backend, table_cache=args.table_cache)
+        tables = dict.fromkeys(relay_types)  # read from the store by gen_settings
+    else:
+        wb = open_relay_workbook(args.workbook, args.backend, args.table_cache)
+        try:
+            for key in relay_types:
+                try:
+                    tables[key] = read_relay_tables(wb, RELAY_TYPES[key]['params'])
+                except Exception as e:
+                    failures[key] = f"Failed to read tables: {str(e)}"
+        finally:
+            wb.close()
+
+    # 2. Generate each relay type
+    for key in relay_types:
+        if key not in tables:
+            continue
+        print(f"=== {RELAY_TYPES[key]['label']} ===")
+        try:
+            gen_kwargs = dict(
+                xl_path=args.workbook,
+                template_path=templates[key],
+                output_path=os.path.join(args.output_root, key),
+                workbook_params=RELAY_TYPES[key]['params'],
+                excluded_regions=exclusions.get(key),
+                include_comments=not args.no_comments,
+                engine=args.engine,
+                workers=args.workers or None,
+                io_workers=args.io_workers,
+                incremental=args.incremental,
+                hardlink=args.hardlink,
+                output_mode=args.output_mode,
+                tables=tables[key],
+                settings_db=args.settings_db,
+                relay_ids=args.relay,
+                dry_run=args.dry_run,
+                previous_path=os.path.join(args.previous, key) if args.previous else None,
+            )
+            if args.profile:
+                results, _ = profile_generation(**gen_kwargs)
+            else:
+                results = gen_settings(**gen_kwargs)
+            skipped = sum(1 for result in results if result['skipped'])
+            print(f"{RELAY_TYPES[key]['label']}: {len(results)} relays ({skipped} unchanged)")
+        except Exception as e:
+            failures[key] = str(e)
+
+    if failures:
+        for key, error in failures.items():
+            print(f"{RELAY_TYPES[key]['label']} failed: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Delta output: only the settings that changed since a previous run.
+
+For each relay the rendered RDB files are compared with the same relay's files in a
+previous output (a directory from output_mode='directory', or <RID>.zip archives from
+output_mode='zip'). Settings files are compared element by element; every file with a
+difference gets a patch in <output>/<RID>/ listing the old and new line of each element
+whose value or comment differs:
+
+    # SET_1.TXT: 2 changed, 1 added, 0 removed
+    - 50P1P,"1.20"<0x1c>Phase OC pickup
+    + 50P1P,"1.50"<0x1c>Phase OC pickup
+    + 50P2P,"4.00"<0x1c>
+
+Other template files are compared byte for byte and copied whole when they differ.
+A summary of every relay is written to <output>/delta_summary.json.
+"""
+import json
+import os
+import shutil
+import zipfile
+
+from template import encode_lines, iter_relay_files
+
+SUMMARY_NAME = 'delta_summary.json'
+PATCH_SUFFIX = '.patch'
+
+
+def element_lines(lines):
+    """{element: line without its newline} for every ELEMENT,... line; section headers are skipped"""
+    elements = {}
+    for line in lines:
+        element, sep, _ = line.partition(',')
+        if sep:
+            elements[element] = line.rstrip('\r\n')
+    return elements
+
+
+def diff_elements(old_lines, new_lines):
+    """
+    Compares two versions of a settings file by element.
+
+    Returns:
+        list: [(element, old line or None, new line or None), ...] for each element that differs,
+        in the new file's order followed by removed elements in the old file's order
+    """
+    old = element_lines(old_lines)
+    new = element_lines(new_lines)
+    changes = [(element, old.get(element), line) for element, line in new.items() if old.get(element) != line]
+    changes.extend((element, line, None) for element, line in old.items() if element not in new)
+    return changes
+
+
+def format_patch(file_name, changes):
+    counts = count_changes(changes)
+    out = [f"# {file_name}: {counts['changed']} changed, {counts['added']} added, {counts['removed']} removed\n"]
+    for _, old_line, new_line in changes:
+        if old_line is not None:
+            out.append(f"- {old_line}\n")
+        if new_line is not None:
+            out.append(f"+ {new_line}\n")
+    return out
+
+
+def count_changes(changes):
+    return {'changed': sum(1 for _, old, new in changes if old is not None and new is not None),
+            'added': sum(1 for _, old, _ in changes if old is None),
+            'removed': sum(1 for _, _, new in changes if new is None)}
+
+
+class PreviousRelay:
+    """Read access to one relay's files in a previous output: <previous>/<RID>/ or <previous>/<RID>.zip"""
+
+    def __init__(self, previous_path, relay_id):
+        self.folder = os.path.join(previous_path, str(relay_id))
+        self.archive = None
+        archive_path = self.folder + '.zip'
+        if not os.path.isdir(self.folder) and os.path.isfile(archive_path):
+            self.archive = zipfile.ZipFile(archive_path)
+            self.archive_names = set(self.archive.namelist())
+
+    @property
+    def exists(self):
+        return self.archive is not None or os.path.isdir(self.folder)
+
+    def read_bytes(self, rel_path):
+        """The file's bytes, or None when the previous output does not have it"""
+        if self.archive is not None:
+            name = rel_path.replace(os.sep, '/')
+            return self.archive.read(name) if name in self.archive_names else None
+        path = os.path.join(self.folder, rel_path)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def check_previous_path(output_path, previous_path):
+    """
+    Raises ValueError when previous_path is output_path or contains it: a delta run replaces the relay
+    folders under output_path, which would destroy the output it compares against.
+    """
+    previous = os.path.realpath(previous_path)
+    output = os.path.realpath(output_path)
+    try:
+        common = os.path.commonpath([previous, output])
+    except ValueError:
+        return  # different drives
+    if common == previous:
+        raise ValueError(f"The previous output {previous_path} must not be the delta output {output_path} "
+                         f"or contain it; write the delta somewhere else")
+
+
+def write_relay_delta(compiled, target_dir, word_bits, excluded_regions, config, previous_path, relay_id,
+                      class_render=None):
+    """
+    Renders one relay in memory and writes patches for the files that differ from the previous output.
+    The previous output is read and compared first; only then is target_dir replaced (it is only
+    created when there is something to write).
+
+    Returns:
+        dict: {'status': 'changed', 'unchanged' or 'new' (no previous output for the relay),
+               'files': {file name: {'changed': n, 'added': n, 'removed': n} or {'replaced': True}}}
+    """
+    template_lines = {template_file['name']: template_file['lines'] for template_file in compiled['files']}
+    previous = PreviousRelay(previous_path, relay_id)
+    summary = {'status': 'unchanged' if previous.exists else 'new', 'files': {}}
+    writes = []  # (path relative to target_dir, bytes of a template file or text of a patch)
+    try:
+        for rel_path, lines in iter_relay_files(compiled, word_bits, excluded_regions, config,
+                                                class_render=class_render):
+            old_bytes = previous.read_bytes(rel_path)
+            if rel_path not in template_lines:
+                # Not a settings file: compared and shipped whole
+                with open(os.path.join(compiled['path'], rel_path), 'rb') as f:
+                    new_bytes = f.read()
+                if new_bytes == old_bytes:
+                    continue
+                writes.append((rel_path, new_bytes))
+                summary['files'][rel_path] = {'replaced': True}
+                continue
+
+            if lines is None:
+                lines = template_lines[rel_path]
+            if old_bytes is not None and old_bytes == encode_lines(lines):
+                continue
+            old_lines = old_bytes.decode('ascii', errors='replace').split('\n') if old_bytes is not None else []
+            changes = diff_elements(old_lines, lines)
+            if not changes:
+                continue
+            writes.append((rel_path + PATCH_SUFFIX, ''.join(format_patch(rel_path, changes))))
+            summary['files'][rel_path] = count_changes(changes)
+    finally:
+        previous.close()
+
+    if os.path.exists(target_dir):
+        shutil.rmtree(target_dir)
+    for rel_path, data in writes:
+        path = os.path.join(target_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(data, bytes):
+            with open(path, 'wb') as f:
+                f.write(data)
+        else:
+            with open(path, 'w', encoding='ascii') as f:
+                f.write(data)
+
+    if summary['files'] and summary['status'] == 'unchanged':
+        summary['status'] = 'changed'
+    return summary
+
+
+def write_summary(output_path, previous_path, results):
+    """Writes delta_summary.json for a delta run and returns its path"""
+    relays = {}
+    for result in results:
+        if result is None:
+            continue
+        relays[str(result['relay'])] = result.get('delta') or {'status': 'error' if result['error'] else 'unchanged',
+                                                               'files': {}}
+        if result['error']:
+            relays[str(result['relay'])]['error'] = result['error']
+    totals = {}
+    for relay in relays.values():
+        totals[relay['status']] = totals.get(relay['status'], 0) + 1
+    summary_path = os.path.join(output_path, SUMMARY_NAME)
+    os.makedirs(output_path, exist_ok=True)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({'previous': os.path.abspath(previous_path), 'totals': totals, 'relays': relays}, f, indent=1)
+    print(f"Delta: {', '.join(f'{n} {status}' for status, n in sorted(totals.items()))} - see {summary_path}")
+    return summary_path
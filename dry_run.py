@@ -0,0 +1,110 @@
+"""
+Dry run: render a fleet in memory and report what generation would do, writing nothing.
+
+Per relay the report holds the lines replaced and cleared across its settings files,
+the bytes its output would take (rendered settings files plus the template files
+copied as they are), the time spent resolving and rendering it, and its unmatched
+word bits: those whose element appears in no template settings file of the group
+they apply to (a word bit without a qs_group applies to every group). Generation
+drops such word bits without a trace, so they usually point at a typo in the
+workbook or a template from another firmware.
+
+Coverage is checked against every settings file of the template, excluded regions
+included: leaving a region untouched is a choice, a missing element is not.
+Byte counts are uncompressed, whatever the output mode.
+"""
+import os
+
+from template import encode_lines, group_key, iter_relay_files
+
+# Unmatched word bits listed per relay in the printed summary
+SUMMARY_UNMATCHED_LIMIT = 10
+
+
+def template_coverage(compiled):
+    """
+    Returns:
+        dict: {'groups': {element: set of settings groups whose template file has it},
+               'sizes': {path relative to the relay folder: bytes of the template file},
+               'matched': {(element, qs_group): bool}, filled in by unmatched_wordbits}
+    """
+    coverage = {'groups': {}, 'sizes': {}, 'matched': {}}
+    for template_file in compiled['files']:
+        for element in template_file['elements']:
+            coverage['groups'].setdefault(element, set()).add(template_file['group'])
+        coverage['sizes'][template_file['name']] = len(encode_lines(template_file['lines']))
+    for rel_path in compiled['copies']:
+        coverage['sizes'][rel_path] = os.path.getsize(os.path.join(compiled['path'], rel_path))
+    return coverage
+
+
+def unmatched_wordbits(word_bits, coverage):
+    """The word bits whose element no template settings file of their group contains, in word bit order"""
+    # Relays share most of their word bits, so each (element, group) pair is looked up once per fleet
+    matched = coverage['matched']
+    unmatched = []
+    for wb in word_bits:
+        key = wb.element, wb.qs_group
+        found = matched.get(key)
+        if found is None:
+            groups = coverage['groups'].get(wb.element)
+            found = matched[key] = bool(groups) and (wb.qs_group is None or group_key(wb.qs_group) in groups)
+        if not found:
+            unmatched.append(wb)
+    return unmatched
+
+
+def output_size(lines):
+    """len(encode_lines(lines)) without building the bytes: the lines are ASCII, only newlines may widen"""
+    size = sum(map(len, lines))
+    if os.linesep != '\n':
+        size += (len(os.linesep) - 1) * sum(line.count('\n') for line in lines)
+    return size
+
+
+def dry_run_relay(compiled, word_bits, excluded_regions, config, coverage, class_render=None):
+    """
+    Renders one relay in memory.
+
+    Returns:
+        dict: {'lines_replaced': n, 'lines_cleared': n, 'files_rendered': settings files that differ from
+               the template, 'bytes': total output bytes, 'bytes_rendered': bytes of those files,
+               'unmatched': [WordBit, ...]}
+    """
+    report = {'lines_replaced': 0, 'lines_cleared': 0, 'files_rendered': 0, 'bytes': 0, 'bytes_rendered': 0}
+
+    def emit(phase, lines_replaced=0, lines_cleared=0, **fields):
+        report['lines_replaced'] += lines_replaced
+        report['lines_cleared'] += lines_cleared
+
+    for rel_path, lines in iter_relay_files(compiled, word_bits, excluded_regions, config, emit, class_render):
+        if lines is None:
+            report['bytes'] += coverage['sizes'][rel_path]
+            continue
+        size = output_size(lines)
+        report['files_rendered'] += 1
+        report['bytes'] += size
+        report['bytes_rendered'] += size
+    report['unmatched'] = unmatched_wordbits(word_bits, coverage)
+    return report
+
+
+def print_fleet_report(results):
+    """Prints one line per relay with unmatched word bits, then the fleet totals"""
+    totals = dict.fromkeys(('lines_replaced', 'lines_cleared', 'files_rendered', 'bytes', 'elapsed'), 0)
+    relays_unmatched = 0
+    for result in results:
+        report = result['dry_run']
+        for key in totals:
+            totals[key] += report[key]
+        if report['unmatched']:
+            relays_unmatched += 1
+            elements = [str(wb.element) if wb.qs_group is None else f"{wb.element} (group {group_key(wb.qs_group)})"
+                        for wb in report['unmatched']]
+            more = len(elements) - SUMMARY_UNMATCHED_LIMIT
+            print(f"{result['relay']}: {len(elements)} unmatched word bits: "
+                  f"{', '.join(elements[:SUMMARY_UNMATCHED_LIMIT])}{f' (+{more} more)' if more > 0 else ''}")
+    print(f"Dry run: {len(results)} relays, {totals['lines_replaced']} lines replaced, "
+          f"{totals['lines_cleared']} cleared, {totals['files_rendered']} files rendered, "
+          f"{totals['bytes'] / 2**20:.1f} MB would be written, {relays_unmatched} relays with unmatched word bits "
+          f"({totals['elapsed']:.2f} s)")
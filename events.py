@@ -0,0 +1,67 @@
+"""
+Structured progress/timing events for gen_settings(observer=...).
+
+Every event is a plain dict with the same keys, so observers can log, aggregate
+or forward them (e.g. through a queue) without special cases:
+
+    {'phase': 'render', 'relay': 'Relay1', 'file': 'SET_1.TXT', 'elapsed': 0.0012,
+     'bytes_read': 0, 'bytes_written': 0, 'lines_replaced': 42, 'lines_cleared': 0}
+
+Phases (relay is None for the run-level ones):
+    'workbook_open'    opening the workbook (bytes_read = workbook file size)
+    'table_read'       reading the class and settings tables (rows = table row count)
+    'template_compile' parsing the template directory once (bytes_read = template bytes)
+    'wordbits'         resolving one relay's word bits (word_bits = count)
+    'directory'        preparing one relay's output folder and copying its non-settings files
+    'render'           applying word bits/clearing to one settings file
+    'write'            writing or cloning one output file; method is 'write' (a rendered file), 'archive'
+                       (into a zip) or, for a template file copied as it is, how template.clone_file
+                       copied it: 'hardlink', 'reflink', 'copy_file_range' or 'copy'
+    'relay'            one relay finished (done/total/skipped/error; elapsed = whole relay)
+"""
+import time
+
+EVENT_FIELDS = ('phase', 'relay', 'file', 'elapsed', 'bytes_read', 'bytes_written', 'lines_replaced',
+                'lines_cleared')
+
+
+def make_event(phase, relay=None, file=None, elapsed=0.0, bytes_read=0, bytes_written=0, lines_replaced=0,
+               lines_cleared=0, **extra):
+    """Builds an event dict with every standard field present; extra fields are appended as-is"""
+    event = {'phase': phase, 'relay': relay, 'file': file, 'elapsed': elapsed, 'bytes_read': bytes_read,
+             'bytes_written': bytes_written, 'lines_replaced': lines_replaced, 'lines_cleared': lines_cleared}
+    event.update(extra)
+    return event
+
+
+def notifier(observer):
+    """Returns notify(phase, **fields) that hands make_event(phase, **fields) to observer; a no-op without one"""
+    def notify(phase, **fields):
+        if observer is not None:
+            observer(make_event(phase, **fields))
+    return notify
+
+
+def relay_emitter(relay_id, sink):
+    """
+    Returns emit(phase, **fields) that tags events with relay_id and hands them to sink.
+    sink is the observer in-process, or list.append inside a process pool worker.
+    """
+    if sink is None:
+        return None
+
+    def emit(phase, **fields):
+        sink(make_event(phase, relay=relay_id, **fields))
+    return emit
+
+
+class PhaseTimer:
+    """Context manager measuring a phase: `with PhaseTimer() as timer: ...` then timer.elapsed"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,83 @@
+"""
+Vectorised class matching for a whole fleet.
+
+Alternative engine to rdb.get_wordbits: instead of resolving one relay at a time,
+the settings class and logic class of every relay and every settings row are
+encoded as integer codes and the relay-by-row match decision is made in one
+NumPy pass. Row selection follows get_wordbits exactly, so
+
+    get_fleet_wordbits(relays, settings) == [get_wordbits(r, settings) for r in relays]
+
+Requires numpy.
+"""
+import numpy as np
+
+from rdb import compile_settings, identity_wordbits, split_logic_classes
+from records import read_settings_rows
+
+
+def encode_values(values, codes):
+    """Maps each value to an integer code, adding unseen values (None included) to `codes`"""
+    return np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int64)
+
+
+def build_match_mask(relays, rows):
+    """
+    Builds the boolean relay-by-row class match matrix.
+
+    Args:
+        relays (list): relay class rows (no header)
+        rows (list): read_settings_rows(settings table)
+
+    Returns:
+        numpy.ndarray: shape (len(relays), len(rows)); True where the row applies to the relay.
+        Rows without an element are never selected.
+    """
+    n_rows = len(rows)
+
+    # Settings class: plain equality, so None on both sides matches just as in get_wordbits
+    set_codes = {}
+    row_set = encode_values([row.set_class for row in rows], set_codes)
+    relay_set = encode_values([relay[1] for relay in relays], set_codes)
+    set_match = relay_set[:, None] == row_set[None, :]
+
+    # Logic class: token incidence matrix (token x row); relays without a known token use the empty last row
+    token_codes = {}
+    token_rows, token_cols = [], []
+    for pos, row in enumerate(rows):
+        if row.logic_class is not None:
+            for token in split_logic_classes(row.logic_class):
+                token_rows.append(token_codes.setdefault(token, len(token_codes)))
+                token_cols.append(pos)
+    incidence = np.zeros((len(token_codes) + 1, n_rows), dtype=bool)
+    incidence[token_rows, token_cols] = True
+
+    no_token = len(token_codes)
+    relay_tokens = np.array([
+        token_codes.get(str(relay[2]).split('.')[0], no_token) if relay[2] is not None else no_token
+        for relay in relays
+    ], dtype=np.int64)
+    logic_match = incidence[relay_tokens]
+
+    unconditional = np.array([row.set_class is None and row.logic_class is None for row in rows], dtype=bool)
+    named = np.array([row.element is not None for row in rows], dtype=bool)
+
+    return (set_match | logic_match | unconditional[None, :]) & named[None, :]
+
+
+def get_fleet_wordbits(relays, settings, pmu=True, mtr=False, dpac=False, include_comments=True):
+    """Word bits for every relay, in the same order and shape get_wordbits produces per relay"""
+    if not relays:
+        return []
+
+    settings_rows = read_settings_rows(settings)
+    settings_index = compile_settings(settings, include_comments=include_comments, settings_rows=settings_rows)
+    row_bits = settings_index['rows']
+    mask = build_match_mask(relays, settings_rows)
+
+    fleet_bits = []
+    for relay, relay_mask in zip(relays, mask):
+        word_bits = identity_wordbits(relay, pmu=pmu, mtr=mtr, dpac=dpac, include_comments=include_comments)
+        word_bits.extend(row_bits[pos] for pos in np.flatnonzero(relay_mask))
+        fleet_bits.append(word_bits)
+    return fleet_bits
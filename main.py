@@ -1,6 +1,11 @@
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from rdb import gen_settings, get_relay_preview
+from profiling import profile_generation
+from rdb import RELAY_TYPES, GenerationCancelled, gen_settings, get_relay_preview
+from table_cache import DEFAULT_CACHE_DIR
 
 
 class SettingsGUI:
@@ -20,31 +25,22 @@ class SettingsGUI:
 
         self.include_comments = tk.BooleanVar(value=True)
         self.status_var = tk.StringVar(value="Ready")
+        self.progress_var = tk.DoubleVar(value=0)
+
+        # Background generation state (see generate_settings / poll_generation)
+        self.generation_thread = None
+        self.progress_queue = None
+        self.cancel_event = None
+        self.generation_start = None
+        # Hidden profiling mode (Ctrl+Shift+P): each run also writes a profile report to the output folder
+        self.profile_enabled = False
+        self.root.bind('<Control-P>', self.toggle_profiling)
         self.selected_type = None
         self.workbook_params = None
         self.region_vars = {}
 
         # Relay Configuration Data
-        self.relay_config = {
-            'feeder': {'label': 'Feeder 351S', 'params': {'sheet_name': 'FDR_351S', 'class_table': 'class_351S',
-                                                          'settings_table': 'settings_351S'}},
-            'hv': {'label': 'HV 351S', 'params': {'sheet_name': 'HV_351S', 'class_table': 'class_HV351S',
-                                                  'settings_table': 'settings_HV351S'}},
-            'xfmr_487E': {'label': 'XFMR 487E', 'params': {'sheet_name': 'XFMR_487E', 'class_table': 'class_487E',
-                                                           'settings_table': 'settings_487E'}},
-            'cap_487V': {'label': 'CAP 487V', 'params': {'sheet_name': 'CAP_487V', 'class_table': 'class_487V',
-                                                         'settings_table': 'settings_487V'}},
-            'bus_587Z': {'label': 'BUS 587Z', 'params': {'sheet_name': 'BUS_587Z', 'class_table': 'class_587Z',
-                                                         'settings_table': 'settings_587Z'}},
-            'mtr_735': {'label': 'MTR 735', 'params': {'sheet_name': 'MTR_735', 'class_table': 'class_735',
-                                                       'settings_table': 'settings_735'}},
-            'dpac_2440': {'label': 'DPAC 2440', 'params': {'sheet_name': 'DPAC_2440', 'class_table': 'class_2440',
-                                                           'settings_table': 'settings_2440'}},
-            'xfmr_787': {'label': 'XFMR 787', 'params': {'sheet_name': 'XFMR_787', 'class_table': 'class_787',
-                                                         'settings_table': 'settings_787'}},
-            'line_411L': {'label': 'LINE 411L', 'params': {'sheet_name': 'Line_411L', 'class_table': 'class_411L',
-                                                           'settings_table': 'settings_411L'}}
-        }
+        self.relay_config = RELAY_TYPES
 
         # Shared definition for 351S style groups
         common_351_groups = {
@@ -178,7 +174,8 @@ class SettingsGUI:
 
         # --- B. RIGHT SIDE BUTTONS ---
         # Back Button
-        ttk.Button(header_frame, text="← Back", command=self.show_selection_screen).pack(side="right")
+        self.back_btn = ttk.Button(header_frame, text="← Back", command=self.show_selection_screen)
+        self.back_btn.pack(side="right")
 
         # --- 2. FILE SELECTORS ---
         # Note: These start at row=1 because the header is row=0
@@ -209,12 +206,20 @@ class SettingsGUI:
         ttk.Checkbutton(options_frame, text="Include Comments in RDB", variable=self.include_comments).pack(side="left")
 
         # --- 6. ACTIONS (Generate Button) ---
-        generate_btn = ttk.Button(main_frame, text="Generate Settings", command=self.generate_settings,
-                                  style='Large.TButton')
-        generate_btn.grid(row=current_row + 2, column=0, columnspan=4, pady=10, sticky="ew")
+        self.generate_btn = ttk.Button(main_frame, text="Generate Settings", command=self.generate_settings,
+                                       style='Large.TButton')
+        self.generate_btn.grid(row=current_row + 2, column=0, columnspan=4, pady=10, sticky="ew")
+
+        # --- 7. PROGRESS (Bar + Cancel) ---
+        self.progress_var.set(0)
+        ttk.Progressbar(main_frame, variable=self.progress_var, maximum=100, mode='determinate').grid(
+            row=current_row + 3, column=0, columnspan=3, sticky="ew", padx=(0, 5))
+        self.cancel_btn = ttk.Button(main_frame, text="Cancel", width=8, command=self.cancel_generation,
+                                     state='disabled')
+        self.cancel_btn.grid(row=current_row + 3, column=3)
 
         # Status Label
-        ttk.Label(main_frame, textvariable=self.status_var, foreground="blue").grid(row=current_row + 3, column=0,
+        ttk.Label(main_frame, textvariable=self.status_var, foreground="blue").grid(row=current_row + 4, column=0,
                                                                                     columnspan=4)
 
         # Ensure the middle column (Input fields) expands
@@ -297,7 +302,7 @@ class SettingsGUI:
             self.root.update()
 
             # 1. Get Data from Backend
-            data = get_relay_preview(self.xl_path.get(), self.workbook_params)
+            data = get_relay_preview(self.xl_path.get(), self.workbook_params, table_cache=DEFAULT_CACHE_DIR)
 
             # 2. Create Popup Window
             top = tk.Toplevel(self.root)
@@ -343,33 +348,114 @@ class SettingsGUI:
             messagebox.showerror("Error",
                                  "Please select all required paths.\n(Template must be re-selected for new relay types)")
             return
+        if self.generation_thread is not None and self.generation_thread.is_alive():
+            return
 
-        try:
-            self.status_var.set("Processing...")
-            self.root.update()
+        excluded_regions = None
+        if self.selected_type in self.relay_region_metadata:
+            excluded_regions = [
+                self.current_region_shorthand[label]
+                for label, var in self.region_vars.items() if not var.get()
+            ]
+
+        gen_kwargs = dict(
+            xl_path=self.xl_path.get(),
+            template_path=self.template_path.get(),
+            output_path=self.output_path.get(),
+            workbook_params=self.workbook_params,
+            excluded_regions=excluded_regions,
+            include_comments=self.include_comments.get(),
+            table_cache=DEFAULT_CACHE_DIR
+        )
 
-            excluded_regions = None
-            if self.selected_type in self.relay_region_metadata:
-                excluded_regions = [
-                    self.current_region_shorthand[label]
-                    for label, var in self.region_vars.items() if not var.get()
-                ]
-
-            gen_settings(
-                xl_path=self.xl_path.get(),
-                template_path=self.template_path.get(),
-                output_path=self.output_path.get(),
-                workbook_params=self.workbook_params,
-                excluded_regions=excluded_regions,
-                include_comments=self.include_comments.get()
-            )
+        # Run on a worker thread so the window stays responsive; progress comes back through the queue
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.generation_start = time.monotonic()
+        self.progress_var.set(0)
+        self.status_var.set("Reading workbook...")
+        self.set_running(True)
 
-            self.status_var.set("Ready")
-            messagebox.showinfo("Success", f"Settings generated for {self.selected_type}!")
+        self.generation_thread = threading.Thread(target=self.run_generation, args=(gen_kwargs,), daemon=True)
+        self.generation_thread.start()
+        self.root.after(100, self.poll_generation)
 
+    def run_generation(self, gen_kwargs):
+        """Worker thread body. Never touches Tk widgets; everything goes through progress_queue."""
+        try:
+            if self.profile_enabled:
+                results, report_path = profile_generation(observer=self.queue_relay_event, cancel=self.cancel_event,
+                                                          **gen_kwargs)
+            else:
+                results = gen_settings(observer=self.queue_relay_event, cancel=self.cancel_event, **gen_kwargs)
+                report_path = None
+            self.progress_queue.put({'phase': 'finished', 'results': results, 'report_path': report_path})
+        except GenerationCancelled as e:
+            self.progress_queue.put({'phase': 'cancelled', 'message': str(e)})
         except Exception as e:
-            self.status_var.set("Error")
-            messagebox.showerror("Execution Error", str(e))
+            self.progress_queue.put({'phase': 'failed', 'message': str(e)})
+
+    def queue_relay_event(self, event):
+        # Only per-relay events drive the progress bar; per-phase/per-file events are not needed here
+        if event['phase'] == 'relay':
+            self.progress_queue.put(event)
+
+    def poll_generation(self):
+        """Drains progress events on the Tk main thread and reschedules itself until the worker finishes."""
+        while True:
+            try:
+                event = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if event['phase'] == 'relay':
+                self.progress_var.set(100.0 * event['done'] / event['total'])
+                elapsed = time.monotonic() - self.generation_start
+                remaining = elapsed / event['done'] * (event['total'] - event['done'])
+                self.status_var.set(f"{event['relay']} done ({event['done']}/{event['total']}) - "
+                                    f"about {self.format_duration(remaining)} left")
+            elif event['phase'] == 'finished':
+                self.set_running(False)
+                self.progress_var.set(100)
+                self.status_var.set("Ready")
+                message = f"Settings generated for {self.selected_type}!"
+                if event['report_path']:
+                    message += f"\n\nProfile saved to {event['report_path']}"
+                messagebox.showinfo("Success", message)
+                return
+            elif event['phase'] == 'cancelled':
+                self.set_running(False)
+                self.status_var.set(event['message'])
+                return
+            elif event['phase'] == 'failed':
+                self.set_running(False)
+                self.status_var.set("Error")
+                messagebox.showerror("Execution Error", event['message'])
+                return
+
+        self.root.after(100, self.poll_generation)
+
+    def toggle_profiling(self, event=None):
+        self.profile_enabled = not self.profile_enabled
+        self.status_var.set("Profiling enabled - reports are saved to the output folder" if self.profile_enabled
+                            else "Profiling disabled")
+
+    def cancel_generation(self):
+        """Stops generation before the next relay; the relay in progress is allowed to finish."""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_btn.config(state='disabled')
+            self.status_var.set("Cancelling after the current relay...")
+
+    def set_running(self, running):
+        self.generate_btn.config(state='disabled' if running else 'normal')
+        self.back_btn.config(state='disabled' if running else 'normal')
+        self.cancel_btn.config(state='normal' if running else 'disabled')
+
+    @staticmethod
+    def format_duration(seconds):
+        minutes, seconds = divmod(int(seconds + 0.5), 60)
+        return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+"""
+Per-relay content-hash manifest for incremental regeneration.
+
+gen_settings records one digest per relay in a manifest file in the output
+directory. The digest covers everything the relay's RDB files are built from:
+its class row, its resolved word bits, the template directory contents,
+the excluded regions, the comment toggle and the device config. On an
+incremental run, relays whose digest is unchanged are skipped.
+
+Each output mode keeps its own section of the manifest: a zip run into a folder
+that also holds a directory run's relay folders must not vouch for those folders.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.rdb_manifest.json'
+MANIFEST_VERSION = 3
+
+
+def hash_template(template_path):
+    """Digest of every file (relative path and bytes) under the template directory"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(template_path):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = os.path.join(root, file_name)
+            digest.update(os.path.relpath(file_path, template_path).replace(os.sep, '/').encode('utf-8'))
+            digest.update(b'\0')
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def relay_digest(relay, word_bits, template_hash, excluded_regions, include_comments, config):
+    """Digest of one relay's generation inputs"""
+    payload = json.dumps({
+        'relay': list(relay),
+        'word_bits': [wb.as_tuple() for wb in word_bits],
+        'template': template_hash,
+        'excluded_regions': sorted(excluded_regions or []),
+        'include_comments': include_comments,
+        'config': config,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _read_modes(output_path):
+    """{output mode: {relay id: digest}} from the output directory, or {} if missing/unreadable/outdated"""
+    manifest_path = os.path.join(output_path, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('modes', {})
+
+
+def load_manifest(output_path, output_mode='directory'):
+    """Returns output_mode's {relay id: digest} from the output directory, or {} if there is none"""
+    return _read_modes(output_path).get(output_mode, {})
+
+
+def save_manifest(output_path, relays, output_mode='directory'):
+    """
+    Writes output_mode's {relay id: digest}, keeping the other modes' sections.
+    Written atomically so an interrupted run never leaves a half-written manifest.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    modes = _read_modes(output_path)
+    modes[output_mode] = relays
+    manifest_path = os.path.join(output_path, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'modes': modes}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
@@ -0,0 +1,163 @@
+"""
+Profiling mode for generation and report runs.
+
+profile_call() runs a function under cProfile and tracemalloc and writes two files
+next to its outputs:
+    profile_<name>_<timestamp>.txt   peak memory and time per phase, then the hottest
+                                     functions by cumulative and by own time
+    profile_<name>_<timestamp>.prof  raw cProfile stats (pstats, snakeviz, ...)
+
+For gen_settings the phases are its observer events (see events.py): the traced
+memory peak between two events is charged to the later event's phase. Report runs
+(word.gen_351S) are a single phase. Only the calling process is profiled, so
+generation with workers > 1 shows the parent's share of the work.
+
+Example:
+    python cli.py Settings.xlsx out --template feeder=templates/351S --profile
+    python profiling.py report
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# Functions listed per hotspot table
+HOTSPOT_LIMIT = 40
+
+
+class PhaseRecorder:
+    """gen_settings observer that tallies events, elapsed time and peak traced memory per phase"""
+
+    def __init__(self, observer=None):
+        self.observer = observer
+        self.phases = {}
+
+    def __call__(self, event):
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        phase = self.phases.setdefault(event['phase'], {'events': 0, 'elapsed': 0.0, 'peak': 0})
+        phase['events'] += 1
+        phase['elapsed'] += event['elapsed']
+        phase['peak'] = max(phase['peak'], peak)
+        if self.observer is not None:
+            self.observer(event)
+
+
+def format_report(name, started, wall_time, peak, phases, profiler, error=None, notes=()):
+    """Builds the text report: summary, per-phase table, then the hotspot tables"""
+    out = io.StringIO()
+    out.write(f"Profile: {name}\nStarted: {started:%Y-%m-%d %H:%M:%S}\n")
+    out.write(f"Wall time: {wall_time:.3f} s\nPeak traced memory: {peak / 2**20:.1f} MB\n")
+    if error is not None:
+        out.write(f"Run failed: {error}\n")
+    for note in notes:
+        out.write(f"Note: {note}\n")
+
+    out.write(f"\n{'Phase':<18}{'Events':>8}{'Time (s)':>12}{'Peak memory (MB)':>19}\n")
+    for phase_name, phase in phases.items():
+        out.write(f"{phase_name:<18}{phase['events']:>8}{phase['elapsed']:>12.3f}{phase['peak'] / 2**20:>19.1f}\n")
+
+    for title, sort_key in (('cumulative time', pstats.SortKey.CUMULATIVE), ('own time', pstats.SortKey.TIME)):
+        out.write(f"\n--- Top {HOTSPOT_LIMIT} functions by {title} ---\n")
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs().sort_stats(sort_key).print_stats(HOTSPOT_LIMIT)
+    return out.getvalue()
+
+
+def profile_call(func, report_dir, name, args=(), kwargs=None, recorder=None, notes=()):
+    """
+    Runs func(*args, **kwargs) under cProfile and tracemalloc and saves the report in report_dir.
+    recorder: optional PhaseRecorder already passed to func as its observer; without one the whole
+    call is reported as a single phase named after name. The report is written even if func raises.
+
+    Returns:
+        tuple: (func's return value, path of the text report)
+    """
+    if recorder is None:
+        recorder = PhaseRecorder()
+    started = datetime.now()
+    stem = os.path.join(report_dir, f"profile_{name}_{started:%Y%m%d_%H%M%S}")
+    profiler = cProfile.Profile()
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    result = None
+    error = None
+    start = time.perf_counter()
+    try:
+        result = profiler.runcall(func, *args, **(kwargs or {}))
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        wall_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max([peak] + [phase['peak'] for phase in recorder.phases.values()])
+        if not already_tracing:
+            tracemalloc.stop()
+        if not recorder.phases:
+            recorder.phases[name] = {'events': 1, 'elapsed': wall_time, 'peak': peak}
+
+        os.makedirs(report_dir, exist_ok=True)
+        profiler.dump_stats(stem + '.prof')
+        with open(stem + '.txt', 'w', encoding='utf-8') as f:
+            f.write(format_report(name, started, wall_time, peak, recorder.phases, profiler, error, notes))
+        print(f"Profile written to {stem}.txt")
+    return result, stem + '.txt'
+
+
+def profile_generation(report_dir=None, **gen_kwargs):
+    """
+    rdb.gen_settings(**gen_kwargs) in profiling mode. The report goes to output_path unless report_dir
+    is given; an observer in gen_kwargs still receives every event.
+
+    Returns:
+        tuple: (gen_settings results, path of the text report)
+    """
+    from rdb import gen_settings
+
+    recorder = PhaseRecorder(gen_kwargs.get('observer'))
+    gen_kwargs['observer'] = recorder
+    notes = []
+    if gen_kwargs.get('workers', 1) != 1:
+        notes.append("workers > 1: relays rendered in the process pool are not in the function tables and their "
+                     "memory is not traced")
+    name = gen_kwargs['workbook_params']['sheet_name']
+    return profile_call(gen_settings, report_dir or gen_kwargs['output_path'], name, kwargs=gen_kwargs,
+                        recorder=recorder, notes=notes)
+
+
+def profile_report(report_dir=None):
+    """
+    word.gen_351S() in profiling mode. The report goes next to the saved document unless report_dir is given.
+
+    Returns:
+        tuple: (path of the saved document, path of the text report)
+    """
+    from word import gen_351S
+
+    # gen_351S asks for the save location itself, so the report lands in a scratch folder until it returns
+    scratch_dir = report_dir or os.getcwd()
+    save_path, report_path = profile_call(gen_351S, scratch_dir, 'gen_351S')
+    if report_dir is None and save_path:
+        target_dir = os.path.dirname(os.path.abspath(save_path))
+        if target_dir != os.path.abspath(scratch_dir):
+            stem = os.path.splitext(report_path)[0]
+            for ext in ('.txt', '.prof'):
+                os.replace(stem + ext, os.path.join(target_dir, os.path.basename(stem) + ext))
+            report_path = os.path.join(target_dir, os.path.basename(report_path))
+            print(f"Profile moved to {report_path}")
+    return save_path, report_path
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ['report']:
+        sys.exit("usage: python profiling.py report [REPORT_DIR]\n"
+                 "(generation runs are profiled with: python cli.py ... --profile)")
+    profile_report(sys.argv[2] if len(sys.argv) > 2 else None)
@@ -1,6 +1,18 @@
+import heapq
 import os
 import shutil
-import xlwings as xw
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from operator import itemgetter
+from delta import check_previous_path, write_relay_delta, write_summary
+from dry_run import dry_run_relay, print_fleet_report, template_coverage
+from events import PhaseTimer, notifier, relay_emitter
+from manifest import hash_template, load_manifest, relay_digest, save_manifest
+from records import WordBit, read_settings_rows
+from template import (build_wordbit_lookup, class_key, compile_template, index_elements, parse_settings_group,
+                      render_archive, render_class, render_lines, render_template, write_relay_archive)
+from workbook import open_workbook
 
 
 # --- Configuration Constants ---
@@ -8,6 +20,34 @@ SERIES_400_DEVICES = ['XFMR_487E', 'CAP_487V', 'Line_411L']
 METER_DEVICES = ['MTR_735']
 DPAC_DEVICES = ['DPAC_2440']
 
+# Relay types: sheet and table names in the settings workbook (shared by the GUI and the batch CLI)
+RELAY_TYPES = {
+    'feeder': {'label': 'Feeder 351S', 'params': {'sheet_name': 'FDR_351S', 'class_table': 'class_351S',
+                                                  'settings_table': 'settings_351S'}},
+    'hv': {'label': 'HV 351S', 'params': {'sheet_name': 'HV_351S', 'class_table': 'class_HV351S',
+                                          'settings_table': 'settings_HV351S'}},
+    'xfmr_487E': {'label': 'XFMR 487E', 'params': {'sheet_name': 'XFMR_487E', 'class_table': 'class_487E',
+                                                   'settings_table': 'settings_487E'}},
+    'cap_487V': {'label': 'CAP 487V', 'params': {'sheet_name': 'CAP_487V', 'class_table': 'class_487V',
+                                                 'settings_table': 'settings_487V'}},
+    'bus_587Z': {'label': 'BUS 587Z', 'params': {'sheet_name': 'BUS_587Z', 'class_table': 'class_587Z',
+                                                 'settings_table': 'settings_587Z'}},
+    'mtr_735': {'label': 'MTR 735', 'params': {'sheet_name': 'MTR_735', 'class_table': 'class_735',
+                                               'settings_table': 'settings_735'}},
+    'dpac_2440': {'label': 'DPAC 2440', 'params': {'sheet_name': 'DPAC_2440', 'class_table': 'class_2440',
+                                                   'settings_table': 'settings_2440'}},
+    'xfmr_787': {'label': 'XFMR 787', 'params': {'sheet_name': 'XFMR_787', 'class_table': 'class_787',
+                                                 'settings_table': 'settings_787'}},
+    'line_411L': {'label': 'LINE 411L', 'params': {'sheet_name': 'Line_411L', 'class_table': 'class_411L',
+                                                   'settings_table': 'settings_411L'}}
+}
+
+# Distinct relay classes whose rendered template is kept for reuse (see get_class_render)
+CLASS_RENDER_CACHE = 64
+
+# Where gen_settings puts each relay's RDB files ('delta' writes patches against a previous output)
+OUTPUT_MODES = ('directory', 'zip', 'fleet_zip', 'delta')
+
 # Mapping logic for different device families
 # This replaces the need for two separate 'update_template' functions
 DEVICE_CONFIGS = {
@@ -27,80 +67,584 @@ DEVICE_CONFIGS = {
 }
 
 
-def gen_settings(xl_path, template_path, output_path, workbook_params, excluded_regions=None, include_comments=True):
+class GenerationCancelled(Exception):
+    """Raised by gen_settings when its cancel event is set between relays"""
+
+
+class GenerationFailed(Exception):
+    """Raised by gen_settings once every relay has been tried if any failed; results holds every relay's result"""
+
+    def __init__(self, message, results):
+        super().__init__(message)
+        self.results = results
+
+
+def gen_settings(xl_path, template_path, output_path, workbook_params, excluded_regions=None, include_comments=True,
+                 backend=None, engine='index', workers=1, incremental=False, hardlink=False, output_mode='directory',
+                 tables=None, observer=None, cancel=None, previous_path=None, io_workers=1, table_cache=None,
+                 settings_db=None, relay_ids=None, dry_run=False):
     """
     Main driver function to generate settings.
     Added include_comments parameter.
+    backend selects the workbook reader ('xlsx' or 'xlwings'); None picks one from the file extension.
+    engine selects word bit resolution: 'index' (per relay, compiled settings index),
+    'matrix' (whole fleet in one NumPy pass, see fleet_match) or 'sqlite' (per relay index lookups in
+    the settings store at settings_db, see settings_store.import_workbook; the workbook is not read).
+    'sqlite' pays off when generating a few relays out of a large fleet; whole fleets are faster with 'index'.
+    relay_ids: optional relay ids to generate; the rest of the fleet is left as it is. Not allowed with
+    output_mode='fleet_zip', whose archive is always rewritten whole.
+    dry_run=True resolves and renders every relay in memory and writes nothing (no output, no manifest):
+    each result gets a 'dry_run' report (see dry_run.py) with lines replaced/cleared, bytes that would be
+    written, elapsed time and the word bits that match no template line. output_mode, workers and the
+    incremental options are ignored.
+    workers > 1 renders relays in a process pool (None uses every core). The workbook is read once here.
+    io_workers > 1 (with workers=1) renders relays on that many threads instead, so the reads and writes of
+    several relays overlap - worthwhile when per-file latency dominates, e.g. on a network share. Output is
+    identical to the sequential path.
+    A manifest of per-relay input hashes is written to output_path (one section per output_mode); with
+    incremental=True relays whose hash matches the previous run in the same mode (and whose directory
+    still exists) are skipped.
+    Template files a relay leaves unchanged are cloned, not rewritten; hardlink=True links them to the template.
+    output_mode: 'directory' (one folder per relay), 'zip' (one <RID>.zip per relay) or 'fleet_zip'
+    (a single <sheet_name>.zip with a folder per relay, always written sequentially and never skipped).
+    output_mode='delta' compares each relay with previous_path (a 'directory' or 'zip' output, which must not
+    be output_path or contain it) and writes per-file patches of the changed elements plus delta_summary.json
+    (see delta.py). Relays whose inputs match previous_path's manifest are reported unchanged without rendering.
+    tables: (class table rows, settings table rows) already read by the caller, e.g. a batch run that
+    opened the workbook once; xl_path and backend are then not used.
+    table_cache: optional cache directory (see table_cache.py); tables read from an unchanged workbook
+    are then loaded from the cache instead of the workbook.
+    observer: optional callable receiving structured events (see events.py): one per phase - workbook open,
+        table read, template compile, and per relay its word bits, directory, each file's render and write -
+        with elapsed time, bytes read/written and lines replaced/cleared, plus a 'relay' event per finished relay:
+        {'phase': 'relay', 'relay': 'Relay1', 'elapsed': 0.04, ..., 'done': 3, 'total': 40, 'skipped': False,
+         'error': None}. With workers > 1 the per-file events are collected in the worker and replayed here.
+    cancel: optional threading.Event; once set, no further relays are started and GenerationCancelled is raised.
+
+    Returns: List of dictionaries [{'relay': 'Relay1', 'output_dir': '...', 'error': None, 'skipped': False}, ...]
+    A relay that fails does not stop the others, in the pool or sequentially: its result gets the error message,
+    and once every relay has been tried GenerationFailed is raised with the full list as its results attribute.
     """
     if excluded_regions is None:
         excluded_regions = []
+    if engine not in ('index', 'matrix', 'sqlite'):
+        raise ValueError(f"Unknown word bit engine '{engine}'. Choose 'index', 'matrix' or 'sqlite'")
+    if engine == 'sqlite' and not settings_db:
+        raise ValueError("engine='sqlite' needs settings_db (a store made by settings_store.import_workbook)")
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{output_mode}'. Choose from: {', '.join(OUTPUT_MODES)}")
+    if output_mode == 'delta' and not previous_path:
+        raise ValueError("output_mode='delta' needs previous_path (the output to compare against)")
+    if output_mode == 'delta':
+        check_previous_path(output_path, previous_path)
+    if relay_ids is not None and output_mode == 'fleet_zip' and not dry_run:
+        raise ValueError("relay_ids cannot be used with output_mode='fleet_zip': the archive is rewritten whole, "
+                         "so it would lose every other relay")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if output_mode == 'fleet_zip':
+        workers = io_workers = 1  # one archive, one writer
 
     sheet_name = workbook_params['sheet_name']
+    config, is_mtr, is_dpac = device_config(sheet_name)
+    notify = notifier(observer)
 
-    if sheet_name in SERIES_400_DEVICES:
-        config = DEVICE_CONFIGS['SERIES_400']
-    else:
-        config = DEVICE_CONFIGS['STANDARD']
+    store = None
+    try:
+        if engine == 'sqlite':
+            from settings_store import SettingsStore
+            store = SettingsStore(settings_db)
+            with PhaseTimer() as timer:
+                tables = store.relay_table(sheet_name, relay_ids), None
+            notify('table_read', elapsed=timer.elapsed, rows=len(tables[0]))
+        elif tables is None:
+            with PhaseTimer() as timer:
+                wb = open_relay_workbook(xl_path, backend, table_cache)
+            notify('workbook_open', elapsed=timer.elapsed, bytes_read=os.path.getsize(xl_path))
+            try:
+                with PhaseTimer() as timer:
+                    tables = read_relay_tables(wb, workbook_params)
+                notify('table_read', elapsed=timer.elapsed, rows=sum(len(table) for table in tables))
+            finally:
+                wb.close()
+        relay_class_rng, settings_rng = tables
+        relay_class = [item for item in relay_class_rng if item[0] is not None]
+        valid_relays = relay_class[1:]
+        if relay_ids is not None:
+            relay_ids = set(relay_ids)
+            valid_relays = [relay for relay in valid_relays if relay[0] in relay_ids]
+
+        # 1. Resolve Word Bits
+        if engine == 'matrix':
+            from fleet_match import get_fleet_wordbits
+            with PhaseTimer() as timer:
+                fleet_bits = get_fleet_wordbits(valid_relays, settings_rng, mtr=is_mtr, dpac=is_dpac,
+                                                include_comments=include_comments)
+            notify('wordbits', elapsed=timer.elapsed, word_bits=sum(len(bits) for bits in fleet_bits))
+        elif engine == 'index':
+            settings_index = compile_settings(settings_rng, include_comments=include_comments)
+
+        # 2. Compile the template
+        with PhaseTimer() as timer:
+            compiled_template = compile_template(template_path, io_workers)
+        notify('template_compile', elapsed=timer.elapsed, bytes_read=compiled_template['bytes_read'])
+        results = [None] * len(valid_relays)  # workbook order regardless of completion order
+        class_renders = {}  # relays of the same class are rendered once, then patched (see get_class_render)
+        done = 0
+
+        def relay_done(i, result, elapsed=0.0):
+            nonlocal done
+            results[i] = result
+            done += 1
+            notify('relay', relay=result['relay'], elapsed=elapsed, done=done, total=len(valid_relays),
+                   skipped=result['skipped'], error=result['error'])
+
+        def check_cancel():
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled(f"Generation cancelled after {done} of {len(valid_relays)} relays")
+
+        def relay_wordbits(i, relay):
+            # Pass the comment toggle down to extraction logic
+            if engine == 'matrix':
+                return fleet_bits[i]
+            with PhaseTimer() as timer:
+                if engine == 'sqlite':
+                    word_bits = store.get_wordbits(relay, sheet_name, mtr=is_mtr, dpac=is_dpac,
+                                                   include_comments=include_comments)
+                else:
+                    word_bits = get_wordbits(relay, settings_rng, mtr=is_mtr, dpac=is_dpac,
+                                             include_comments=include_comments, settings_index=settings_index)
+            notify('wordbits', relay=relay[0], elapsed=timer.elapsed, word_bits=len(word_bits))
+            return word_bits
+
+        if dry_run:
+            coverage = template_coverage(compiled_template)
+            for i, relay in enumerate(valid_relays):
+                check_cancel()
+                with PhaseTimer() as timer:
+                    word_bits = relay_wordbits(i, relay)
+                    class_id = get_relay_class(relay, word_bits, is_mtr, is_dpac, include_comments)
+                    class_render = get_class_render(class_renders, class_id, compiled_template, word_bits,
+                                                    excluded_regions, config)
+                    report = dry_run_relay(compiled_template, word_bits, excluded_regions, config, coverage,
+                                           class_render)
+                report['elapsed'] = timer.elapsed
+                relay_done(i, {'relay': relay[0], 'output_dir': None, 'error': None, 'skipped': False,
+                               'dry_run': report}, timer.elapsed)
+            print_fleet_report(results)
+            return results
+
+        # 3. Compare against the previous run's manifest
+        run = start_run(output_path, output_mode, sheet_name, template_path, compiled_template, excluded_regions,
+                        include_comments, incremental, hardlink, observer, previous_path, class_renders)
+        manifest = run['manifest']
+
+        def relay_jobs():
+            for i, relay in enumerate(valid_relays):
+                check_cancel()
+                word_bits = relay_wordbits(i, relay)
+                target, digest, class_id, skipped = plan_relay(run, relay, word_bits)
+                if skipped is not None:
+                    relay_done(i, skipped)
+                    continue
+                yield i, relay, target, word_bits, digest, class_id
+
+        # 4. Create Directories & Process Settings
+        try:
+            if (workers > 1 or io_workers > 1) and len(valid_relays) > 1:
+                if workers > 1:
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                               initargs=(compiled_template,))
+                    shared = {}  # workers hold their own template and class renders
+                else:
+                    # Threads overlap the file I/O of several relays; rendering itself still takes turns on the GIL
+                    pool = ThreadPoolExecutor(max_workers=io_workers)
+                    shared = {'compiled_template': compiled_template, 'class_renders': class_renders}
+                with pool:
+                    futures = {}
+                    for i, relay, new_dir, word_bits, digest, class_id in relay_jobs():
+                        print(f"Processing {relay[0]}...")
+                        future = pool.submit(_render_relay_in_worker, relay[0], new_dir, word_bits, excluded_regions,
+                                             config, hardlink, output_mode, observer is not None, previous_path,
+                                             class_id, **shared)
+                        futures[future] = (i, relay, new_dir, digest)
+
+                    for future in as_completed(futures):
+                        if cancel is not None and cancel.is_set():
+                            for pending in futures:
+                                pending.cancel()  # relays already running are left to finish
+                        if future.cancelled():
+                            continue
+                        i, relay, new_dir, digest = futures[future]
+                        error = future.exception()
+                        elapsed = 0.0
+                        rendered = None
+                        if error is None:
+                            elapsed, worker_events, rendered = future.result()
+                            for event in worker_events:
+                                observer(event)
+                            manifest[str(relay[0])] = digest
+                            print(f"{relay[0]} settings complete.")
+                        else:
+                            manifest.pop(str(relay[0]), None)
+                            print(f"{relay[0]} failed: {str(error)}")
+                        result = {'relay': relay[0], 'output_dir': new_dir,
+                                  'error': str(error) if error is not None else None, 'skipped': False}
+                        if output_mode == 'delta':
+                            result['delta'] = rendered
+                        relay_done(i, result, elapsed)
+
+                check_cancel()
+            else:
+                open_fleet_zip(run)
+                try:
+                    for i, relay, new_dir, word_bits, digest, class_id in relay_jobs():
+                        result, elapsed = write_relay(run, relay, word_bits, new_dir, digest, class_id)
+                        relay_done(i, result, elapsed)
+                finally:
+                    close_fleet_zip(run)
+        finally:
+            # Record whatever finished, even if the run stopped part way
+            save_manifest(output_path, manifest, output_mode)
+
+        if output_mode == 'delta':
+            write_summary(output_path, previous_path, results)
+        failed = [result for result in results if result['error'] is not None]
+        if failed:
+            details = '; '.join(f"{result['relay']}: {result['error']}" for result in failed)
+            raise GenerationFailed(f"Settings generation failed for {len(failed)} relay(s): {details}", results)
+        return results
+
+    except GenerationCancelled as e:
+        print(str(e))
+        raise
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        raise
+    finally:
+        if store is not None:
+            store.close()
 
-    is_mtr = sheet_name in METER_DEVICES
-    is_dpac = sheet_name in DPAC_DEVICES
 
-    app = xw.App(visible=False)
+def stream_settings(xl_path, template_path, output_path, workbook_params, excluded_regions=None,
+                    include_comments=True, backend=None, incremental=False, hardlink=False, output_mode='directory',
+                    observer=None, cancel=None, table_cache=None):
+    """
+    Memory-bounded variant of gen_settings for very large fleets: a generator that reads, renders and writes
+    one relay at a time and yields its result dict ({'relay', 'output_dir', 'error', 'skipped'}) as soon as it
+    is written. Only the settings table (compiled once) and the template are held in memory; the class table
+    is streamed from the workbook row by row, so memory stays flat as the fleet grows.
+
+    Options match gen_settings, except that word bits always use the 'index' engine and relays are rendered
+    sequentially (the 'matrix' engine and the process pool both need the whole fleet up front).
+    'relay' events carry total=None since the fleet size is not known in advance. The manifest (one digest
+    per relay) is the only per-relay state kept, and is saved when the generator finishes or is closed.
+    With table_cache only the settings table is cached; the class table is always streamed from the workbook.
+    A relay that fails is yielded with its error and the stream goes on; the per-relay steps are the ones
+    gen_settings runs sequentially (plan_relay, write_relay).
+    """
+    if excluded_regions is None:
+        excluded_regions = []
+    if output_mode not in OUTPUT_MODES or output_mode == 'delta':
+        raise ValueError(f"Unknown output mode '{output_mode}' for streaming. "
+                         f"Choose from: {', '.join(mode for mode in OUTPUT_MODES if mode != 'delta')}")
+
+    sheet_name = workbook_params['sheet_name']
+    _, is_mtr, is_dpac = device_config(sheet_name)
+    notify = notifier(observer)
+
+    with PhaseTimer() as timer:
+        wb = open_relay_workbook(xl_path, backend, table_cache)
+    notify('workbook_open', elapsed=timer.elapsed, bytes_read=os.path.getsize(xl_path))
+    run = None
     try:
-        wb = app.books.open(xl_path)
-        sheet = wb.sheets[sheet_name]
+        # 1. The settings table is needed for every relay: read and compile it once, then let the rows go
+        with PhaseTimer() as timer:
+            settings_rng = wb.read_table(sheet_name, workbook_params['settings_table'])
+        notify('table_read', elapsed=timer.elapsed, rows=len(settings_rng))
+        settings_index = compile_settings(settings_rng, include_comments=include_comments)
+        del settings_rng
+
+        with PhaseTimer() as timer:
+            compiled_template = compile_template(template_path)
+        notify('template_compile', elapsed=timer.elapsed, bytes_read=compiled_template['bytes_read'])
+        # class renders are bounded by CLASS_RENDER_CACHE
+        run = start_run(output_path, output_mode, sheet_name, template_path, compiled_template, excluded_regions,
+                        include_comments, incremental, hardlink, observer)
+        open_fleet_zip(run)
+
+        # 2. Stream the class table: one relay in memory at a time
+        done = 0
+        rows = wb.iter_table(sheet_name, workbook_params['class_table'])
+        next(rows, None)  # header
+        for relay in rows:
+            if relay[0] is None:
+                continue
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled(f"Generation cancelled after {done} relays")
+
+            with PhaseTimer() as timer:
+                word_bits = get_wordbits(relay, None, mtr=is_mtr, dpac=is_dpac, include_comments=include_comments,
+                                         settings_index=settings_index)
+            notify('wordbits', relay=relay[0], elapsed=timer.elapsed, word_bits=len(word_bits))
+            target, digest, class_id, result = plan_relay(run, relay, word_bits)
+            elapsed = 0.0
+            if result is None:
+                result, elapsed = write_relay(run, relay, word_bits, target, digest, class_id)
+
+            done += 1
+            notify('relay', relay=result['relay'], elapsed=elapsed, done=done, total=None,
+                   skipped=result['skipped'], error=result['error'])
+            yield result
+    finally:
+        wb.close()
+        if run is not None:
+            close_fleet_zip(run)
+            save_manifest(output_path, run['manifest'], output_mode)
 
-        relay_class_rng = sheet.tables[workbook_params['class_table']].range.value
-        settings_rng = sheet.tables[workbook_params['settings_table']].range.value
-        relay_class = [item for item in relay_class_rng if item[0] is not None]
 
-        # 1. Create Directories
-        output_dirs = []
-        valid_relays = []
+def device_config(sheet_name):
+    """(DEVICE_CONFIGS entry, is a meter, is a DPAC) for a relay type's sheet"""
+    config = DEVICE_CONFIGS['SERIES_400'] if sheet_name in SERIES_400_DEVICES else DEVICE_CONFIGS['STANDARD']
+    return config, sheet_name in METER_DEVICES, sheet_name in DPAC_DEVICES
 
-        for relay in relay_class[1:]:
-            if relay[0] is not None:
-                new_dir = os.path.join(output_path, str(relay[0]))
-                if os.path.exists(new_dir):
-                    shutil.rmtree(new_dir)
-                shutil.copytree(template_path, new_dir)
-                output_dirs.append(new_dir)
-                valid_relays.append(relay)
 
-        # 2. Process Settings
-        for i, relay in enumerate(valid_relays):
-            print(f"Processing {relay[0]}...")
+def start_run(output_path, output_mode, sheet_name, template_path, compiled_template, excluded_regions,
+              include_comments, incremental, hardlink, observer, previous_path=None, class_renders=None):
+    """
+    The state gen_settings and stream_settings share across the relays of a run (see plan_relay and
+    write_relay): the options, the template hash, the manifest of the last run in this output mode and,
+    for delta runs, the previous output's manifests.
+    """
+    config, is_mtr, is_dpac = device_config(sheet_name)
+    run = {'output_path': output_path, 'output_mode': output_mode, 'compiled_template': compiled_template,
+           'excluded_regions': excluded_regions, 'include_comments': include_comments, 'incremental': incremental,
+           'hardlink': hardlink, 'observer': observer, 'previous_path': previous_path, 'config': config,
+           'is_mtr': is_mtr, 'is_dpac': is_dpac,
+           'class_renders': {} if class_renders is None else class_renders,
+           'template_hash': hash_template(template_path),
+           'manifest': load_manifest(output_path, output_mode),
+           'fleet_path': os.path.join(output_path, f"{sheet_name}.zip"), 'fleet_zip': None}
+    if output_mode == 'delta':
+        run['previous_manifests'] = {mode: load_manifest(previous_path, mode) for mode in ('directory', 'zip')}
+    return run
+
+
+def open_fleet_zip(run):
+    """Opens the fleet archive for writing when the run's output_mode is 'fleet_zip'"""
+    if run['output_mode'] == 'fleet_zip':
+        os.makedirs(run['output_path'], exist_ok=True)
+        run['fleet_zip'] = zipfile.ZipFile(run['fleet_path'], 'w', compression=zipfile.ZIP_DEFLATED)
+
+
+def close_fleet_zip(run):
+    if run['fleet_zip'] is not None:
+        run['fleet_zip'].close()
+        run['fleet_zip'] = None
+
+
+def plan_relay(run, relay, word_bits):
+    """
+    Resolves one relay against the run: where its output goes, its input digest and its class, and whether
+    it can be skipped (unchanged since the last incremental run, or for delta since the previous output).
 
-            # Pass the comment toggle down to extraction logic
-            word_bits = get_wordbits(relay, settings_rng, mtr=is_mtr, dpac=is_dpac, include_comments=include_comments)
+    Returns:
+        tuple: (target, digest, class id, result of the skipped relay or None)
+    """
+    relay_id = str(relay[0])
+    target = relay_target(run['output_path'], relay, run['output_mode'], run['fleet_path'])
+    digest = relay_digest(relay, word_bits, run['template_hash'], run['excluded_regions'], run['include_comments'],
+                          run['config'])
+    class_id = get_relay_class(relay, word_bits, run['is_mtr'], run['is_dpac'], run['include_comments'])
+
+    if (run['incremental'] and run['output_mode'] != 'fleet_zip' and run['manifest'].get(relay_id) == digest
+            and os.path.exists(target)):
+        print(f"{relay[0]} unchanged, skipping.")
+        return target, digest, class_id, {'relay': relay[0], 'output_dir': target, 'error': None, 'skipped': True}
+    if (run['output_mode'] == 'delta'
+            and previous_digest(run['previous_manifests'], run['previous_path'], relay) == digest):
+        print(f"{relay[0]} unchanged since the previous output.")
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        run['manifest'][relay_id] = digest
+        return target, digest, class_id, {'relay': relay[0], 'output_dir': target, 'error': None, 'skipped': True,
+                                          'delta': {'status': 'unchanged', 'files': {}}}
+    return target, digest, class_id, None
+
+
+def write_relay(run, relay, word_bits, target, digest, class_id):
+    """
+    Renders and writes one planned relay in this thread (into the fleet archive when it is open) and records
+    its digest in the manifest. A failure is reported in the result rather than raised.
 
-            process_rdb_files(output_dirs[i], word_bits, excluded_regions, config)
+    Returns:
+        tuple: (result dict, elapsed seconds)
+    """
+    print(f"Processing {relay[0]}...")
+    run['manifest'].pop(str(relay[0]), None)
+    emit = relay_emitter(relay[0], run['observer'])
+    compiled_template = run['compiled_template']
+    error = None
+    rendered = None
+    with PhaseTimer() as timer:
+        try:
+            if run['fleet_zip'] is not None:
+                class_render = get_class_render(run['class_renders'], class_id, compiled_template, word_bits,
+                                                run['excluded_regions'], run['config'])
+                write_relay_archive(compiled_template, run['fleet_zip'], word_bits, run['excluded_regions'],
+                                    run['config'], prefix=str(relay[0]), emit=emit, class_render=class_render)
+            else:
+                rendered = render_relay(target, word_bits, run['excluded_regions'], run['config'], compiled_template,
+                                        run['hardlink'], run['output_mode'], emit, run['previous_path'], class_id,
+                                        run['class_renders'])
+        except Exception as e:
+            error = e
+    if error is None:
+        run['manifest'][str(relay[0])] = digest
+        print(f"{relay[0]} settings complete.")
+    else:
+        print(f"{relay[0]} failed: {str(error)}")
+    result = {'relay': relay[0], 'output_dir': target, 'error': str(error) if error is not None else None,
+              'skipped': False}
+    if run['output_mode'] == 'delta':
+        result['delta'] = rendered
+    return result, timer.elapsed
 
-            print(f"{relay[0]} settings complete.")
 
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        raise
-    finally:
-        wb.close()
-        app.quit()
+def previous_digest(previous_manifests, previous_path, relay):
+    """
+    The digest the previous output recorded for the files delta.PreviousRelay will read: the relay's folder
+    if there is one (directory section), else its <RID>.zip (zip section).
+    """
+    relay_path = os.path.join(previous_path, str(relay[0]))
+    if os.path.isdir(relay_path):
+        return previous_manifests['directory'].get(str(relay[0]))
+    if os.path.isfile(relay_path + '.zip'):
+        return previous_manifests['zip'].get(str(relay[0]))
+    return None
+
+
+def relay_target(output_path, relay, output_mode, fleet_path=None):
+    """Where a relay's output goes: its folder, its <RID>.zip, or the shared fleet archive"""
+    if output_mode == 'fleet_zip':
+        return fleet_path
+    if output_mode == 'zip':
+        return os.path.join(output_path, f"{relay[0]}.zip")
+    return os.path.join(output_path, str(relay[0]))
+
+
+def open_relay_workbook(xl_path, backend=None, table_cache=None):
+    """open_workbook, or a table_cache.CachedWorkbook over it when table_cache (a cache directory) is given"""
+    if table_cache is None:
+        return open_workbook(xl_path, backend)
+    from table_cache import CachedWorkbook
+    return CachedWorkbook(xl_path, backend, table_cache)
+
+
+def read_relay_tables(wb, workbook_params):
+    """Reads one relay type's (class table, settings table) from an open workbook in a single pass"""
+    class_table = workbook_params['class_table']
+    settings_table = workbook_params['settings_table']
+    tables = wb.read_tables(workbook_params['sheet_name'], [class_table, settings_table])
+    return tables[class_table], tables[settings_table]
+
 
+# Compiled template and class renders of a process pool worker, set once per worker by _init_worker
+_worker_template = None
+_worker_class_renders = {}
 
-def get_relay_preview(xl_path, workbook_params):
+
+# get_class_render is also called from gen_settings' I/O threads, which share one cache
+_class_render_lock = threading.Lock()
+
+
+def _init_worker(compiled_template):
+    global _worker_template, _worker_class_renders
+    _worker_template = compiled_template
+    _worker_class_renders = {}
+
+
+def get_relay_class(relay, word_bits, mtr=False, dpac=False, include_comments=True):
+    """(template.class_key, number of identity bits at the front of word_bits) for a relay"""
+    identity_count = len(identity_wordbits(relay, mtr=mtr, dpac=dpac, include_comments=include_comments))
+    return class_key(relay, word_bits[:identity_count]), identity_count
+
+
+def get_class_render(class_renders, relay_class, compiled_template, word_bits, excluded_regions, config):
     """
-    Reads the Class Table from the workbook for preview purposes.
-    Returns: List of dictionaries [{'rid': 'Relay1', 'set_class': 'A', 'log_class': 'L1'}, ...]
+    The template rendered for relay_class, from the cache or rendered now with this relay's word bits.
+    The cache keeps the CLASS_RENDER_CACHE most recently added classes, so fleets where nearly every relay
+    has its own class don't accumulate renders.
     """
-    import xlwings as xw
+    key, identity_count = relay_class
+    with _class_render_lock:
+        class_render = class_renders.get(key)
+        if class_render is None:
+            if len(class_renders) >= CLASS_RENDER_CACHE:
+                del class_renders[next(iter(class_renders))]
+            class_render = render_class(compiled_template, word_bits, identity_count, excluded_regions, config)
+            class_renders[key] = class_render
+    return class_render
+
+
+def render_relay(target, word_bits, excluded_regions, config, compiled_template=None, hardlink=False,
+                 output_mode='directory', emit=None, previous_path=None, relay_class=None, class_renders=None):
+    """
+    Writes one relay's RDB directory (or .zip archive with output_mode='zip') from the compiled template.
+    With output_mode='delta' it writes patches against previous_path instead and returns the relay's
+    delta summary (see delta.write_relay_delta).
+    Module level so it can run in a process pool worker, where the template and class render cache come
+    from _init_worker.
+    emit: optional events.relay_emitter(...) callable for per-file events.
+    relay_class: optional get_relay_class(...) result; the relay is then patched from its class's render in
+    class_renders instead of rendered from scratch.
+    """
+    if compiled_template is None:
+        compiled_template = _worker_template
+        class_renders = _worker_class_renders
+    class_render = None
+    if relay_class is not None and class_renders is not None:
+        class_render = get_class_render(class_renders, relay_class, compiled_template, word_bits, excluded_regions,
+                                        config)
+    if output_mode == 'delta':
+        return write_relay_delta(compiled_template, target, word_bits, excluded_regions, config, previous_path,
+                                 os.path.basename(target), class_render)
+    if output_mode == 'zip':
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        return render_archive(compiled_template, target, word_bits, excluded_regions, config, emit=emit,
+                              class_render=class_render)
+    return render_template(compiled_template, target, word_bits, excluded_regions, config, hardlink=hardlink,
+                           emit=emit, class_render=class_render)
+
+
+def _render_relay_in_worker(relay_id, target, word_bits, excluded_regions, config, hardlink, output_mode,
+                            collect_events, previous_path=None, relay_class=None, compiled_template=None,
+                            class_renders=None):
+    """
+    Process pool (or I/O thread) entry point. Returns (elapsed, events, render_relay's return value) so the
+    parent can replay events to its observer from its own thread. Threads pass the parent's compiled_template
+    and class_renders; processes use the ones set by _init_worker.
+    """
+    events = [] if collect_events else None
+    with PhaseTimer() as timer:
+        rendered = render_relay(target, word_bits, excluded_regions, config, compiled_template, hardlink=hardlink,
+                                output_mode=output_mode, emit=relay_emitter(relay_id, events.append if collect_events
+                                                                            else None),
+                                previous_path=previous_path, relay_class=relay_class, class_renders=class_renders)
+    return timer.elapsed, events or [], rendered
+
 
+def get_relay_preview(xl_path, workbook_params, backend=None, table_cache=None):
+    """
+    Reads the Class Table from the workbook for preview purposes (through table_cache when given, see gen_settings).
+    Returns: List of dictionaries [{'rid': 'Relay1', 'set_class': 'A', 'log_class': 'L1'}, ...]
+    """
     preview_data = []
-    app = xw.App(visible=False)
     try:
-        wb = app.books.open(xl_path)
-        sheet = wb.sheets[workbook_params['sheet_name']]
+        wb = open_relay_workbook(xl_path, backend, table_cache)
 
         # Read the class table range
-        raw_data = sheet.tables[workbook_params['class_table']].range.value
+        raw_data = wb.read_table(workbook_params['sheet_name'], workbook_params['class_table'])
 
         # Parse data (Skipping header row)
         # Assuming structure: [RelayID, SettingsClass, LogicClass, IP, ...]
@@ -117,174 +661,148 @@ def get_relay_preview(xl_path, workbook_params):
         raise Exception(f"Failed to read workbook: {str(e)}")
     finally:
         if 'wb' in locals(): wb.close()
-        app.quit()
 
     return preview_data
 
 
-def get_wordbits(relay, settings, pmu=True, mtr=False, dpac=False, include_comments=True):
-    """Extracts word bits from settings table
+def split_logic_classes(logic_class):
+    """Normalises a comma separated logic class cell: '1, 2.0,3' -> ['1', '2', '3']"""
+    logic_class_list = str(logic_class).replace(' ', '').split(',')  # split logic class into array
+    return [s.split('.')[0] for s in logic_class_list]
+
+
+def compile_settings(settings, include_comments=True, settings_rows=None):
+    """Pre-processes the settings table once so each relay's word bits are a merge of precomputed lists
 
     Args:
-        relay (list): relay class definition including RID, IP, Settings Class, Logic Class, etc.
         settings (list): list including word bits and their associated values and properties
-        pmu (bool): include PMU station name
+        include_comments (bool): keep the description column as the RDB comment
+        settings_rows (list): read_settings_rows(settings), when the caller already has it
+
+    Returns:
+        dict: {'rows': [WordBit or None, ...],
+               'unconditional': [(row_pos, word_bit), ...],
+               'by_set_class': {settings class: [(row_pos, word_bit), ...]},
+               'by_logic_class': {logic class: [(row_pos, word_bit), ...]}}
+        row_pos indexes 'rows', which lines up with settings[1:] (None where the row has no element).
+        Every list is in settings table order.
         """
+    if settings_rows is None:
+        settings_rows = read_settings_rows(settings)
+    index = {'rows': [], 'unconditional': [], 'by_set_class': {}, 'by_logic_class': {}}
+
+    for pos, row in enumerate(settings_rows):
+        if row.element is None:
+            index['rows'].append(None)
+            continue
+
+        if isinstance(row.value, float) and row.is_float:  # Round floats
+            value = "{:.2f}".format(row.value)  # To 2 decimal places
+        elif isinstance(row.value, float):
+            value = str(int(row.value))
+        else:
+            value = row.value
+        word_bit = WordBit(row.element, value, row.qs_group, row.comment if include_comments else "")
+        index['rows'].append(word_bit)
+        entry = (pos, word_bit)
+
+        if row.set_class is None and row.logic_class is None:
+            index['unconditional'].append(entry)
+        index['by_set_class'].setdefault(row.set_class, []).append(entry)
+        if row.logic_class is not None:
+            for logic_class in dict.fromkeys(split_logic_classes(row.logic_class)):
+                index['by_logic_class'].setdefault(logic_class, []).append(entry)
+
+    return index
+
+
+def match_settings(relay, settings_index):
+    """Yields the word bits of every settings row whose class conditions match the relay, in table order"""
+    sources = [settings_index['unconditional'], settings_index['by_set_class'].get(relay[1], [])]
+    if relay[2] is not None:
+        sources.append(settings_index['by_logic_class'].get(str(relay[2]).split('.')[0], []))
+
+    last_pos = None
+    for pos, word_bit in heapq.merge(*sources, key=itemgetter(0)):
+        if pos != last_pos:  # a row can match on more than one condition
+            yield word_bit
+            last_pos = pos
+
+
+def identity_wordbits(relay, pmu=True, mtr=False, dpac=False, include_comments=True):
+    """Builds the per-relay identity word bits (RID/MID/DID, IPADDR, PMSTN) that precede the settings rows"""
 
     def get_cmt(text):
         return text if include_comments else ""
 
-    float_index = settings[0].index('Float')
     word_bits = []
     if mtr:
-        word_bits.append({'element': 'MID', 'value': relay[0], 'qs_group': None, 'comment': get_cmt('Meter ID')})
+        word_bits.append(WordBit('MID', relay[0], None, get_cmt('Meter ID')))
     elif dpac:
-        word_bits.append({'element': 'DID', 'value': relay[0], 'qs_group': None, 'comment': get_cmt('Device ID')})
+        word_bits.append(WordBit('DID', relay[0], None, get_cmt('Device ID')))
     else:
-        word_bits.append({'element': 'RID', 'value': relay[0], 'qs_group': None, 'comment': get_cmt('Relay ID')})
+        word_bits.append(WordBit('RID', relay[0], None, get_cmt('Relay ID')))
     try:
-        word_bits.append({'element': 'IPADDR', 'value': relay[3], 'qs_group': None, 'comment': get_cmt('IP Address')})
+        word_bits.append(WordBit('IPADDR', relay[3], None, get_cmt('IP Address')))
     except IndexError:
         pass
     if pmu:
-        pmu_id = {'element': 'PMSTN', 'value': relay[0], 'qs_group': None, 'comment': get_cmt('Phasor ID')}
-        word_bits.append(pmu_id)
-    for row in settings[1:]:  # exclude headers
-        if row[6] is not None:
-            logic_class_list = str(row[6]).replace(' ', '').split(',')  # split logic class into array
-            logic_class_list = [s.split('.')[0] for s in logic_class_list]
-        else:
-            logic_class_list = []
-        if relay[2] is not None:
-            logic_eval = str(relay[2]).split('.')[0] in logic_class_list
-        else:
-            logic_eval = False
-        and_conditions = [row[5] is None, row[6] is None]
-        or_conditions = [row[5] == relay[1], logic_eval]
-        if all(and_conditions) or any(or_conditions):  # Class match
-            if row[0] is not None:
-                if isinstance(row[1], float) and row[float_index]:  # Round floats
-                    formatted_string = "{:.2f}".format(row[1])  # To 2 decimal places
-                    word_bits.append(
-                        {'element': row[0], 'value': formatted_string, 'qs_group': row[8], 'comment': get_cmt(row[2])})
-                elif isinstance(row[1], float):
-                    word_bits.append(
-                        {'element': row[0], 'value': str(int(row[1])), 'qs_group': row[8], 'comment': get_cmt(row[2])})
-                else:
-                    word_bits.append({'element': row[0], 'value': row[1], 'qs_group': row[8], 'comment': get_cmt(row[2])})
+        word_bits.append(WordBit('PMSTN', relay[0], None, get_cmt('Phasor ID')))
+    return word_bits
+
+
+def get_wordbits(relay, settings, pmu=True, mtr=False, dpac=False, include_comments=True, settings_index=None):
+    """Extracts word bits from settings table
+
+    Args:
+        relay (list): relay class definition including RID, IP, Settings Class, Logic Class, etc.
+        settings (list): list including word bits and their associated values and properties
+        pmu (bool): include PMU station name
+        settings_index (dict): output of compile_settings(settings); built on the fly when omitted
+        """
+    if settings_index is None:
+        settings_index = compile_settings(settings, include_comments=include_comments)
+
+    word_bits = identity_wordbits(relay, pmu=pmu, mtr=mtr, dpac=dpac, include_comments=include_comments)
+    word_bits.extend(match_settings(relay, settings_index))
     return word_bits
 
 
-def process_rdb_files(target_dir, word_bits, excluded_regions, config):
+def process_rdb_files(target_dir, word_bits, excluded_regions, config, io_workers=1):
     """
     Unified function to process RDB text files.
     Replaces both update_template and update_template_400.
+    io_workers > 1 reads, renders and writes that many files at once on threads (same output).
     """
     if excluded_regions is None:
         excluded_regions = []
 
-    # Optimize: Create a lookup dictionary for word bits to avoid nested loops.
-    # Key: Element Name, Value: Bit Data
-    # Note: If duplicate elements exist across different groups, this logic holds
-    # because we check qs_group match inside the loop.
-    wb_lookup = {wb['element']: wb for wb in word_bits}
-
-    for file_name in os.listdir(target_dir):
-        if not file_name.lower().endswith('.txt'):
-            continue
-
-        # Parse Group from filename (e.g., 'SET_1.TXT' -> '1')
-        try:
-            parts = file_name.split('_')
-            if len(parts) > 1:
-                settings_group = parts[1].split('.')[0]
-            else:
-                settings_group = "UNKNOWN"
-        except IndexError:
-            continue
-
-        if settings_group in excluded_regions:
-            continue
+    wb_lookup = build_wordbit_lookup(word_bits)
 
+    def process_file(file_name):
+        settings_group = parse_settings_group(file_name)
         file_path = os.path.join(target_dir, file_name)
 
         # Read content
         with open(file_path, 'r') as f:
             lines = f.readlines()
 
-        new_lines = []
-        found_indices = set()
-
-        # PASS 1: Update values from Word Bits
-        for idx, line in enumerate(lines):
-            line_parts = line.split(',')
-            if not line_parts:
-                new_lines.append(line)
-                continue
-
-            element_key = line_parts[0]
-
-            # Check if this element exists in our Excel data
-            if element_key in wb_lookup:
-                wb = wb_lookup[element_key]
-
-                # Check Group Constraint
-                if wb['qs_group'] is None or str(wb['qs_group']) == settings_group:
-                    # Only update if we have a value
-                    if wb['value']:
-                        # Construct SEL RDB format: ELEMENT,"VALUE"<0x1c>COMMENT
-                        new_line = f'{wb["element"]},"{wb["value"]}"\x1c{wb["comment"]}\n'
-                        new_lines.append(new_line)
-                        found_indices.add(idx)
-                        continue
-
-            new_lines.append(line)
-
-        # PASS 2: Clear Logic (D1, L1... or F1 specific handling)
-        final_lines = []
-
-        # Determine if this file needs clearing logic
-        needs_clearing = settings_group in config['clear_groups']
-        is_f1 = (settings_group == 'F1') and config['process_f1']
-
-        if needs_clearing or is_f1:
-            for idx, line in enumerate(new_lines):
-                # Skip lines we just updated
-                if idx in found_indices:
-                    final_lines.append(line)
-                    continue
-
-                line_parts = line.split(',')
-                if len(line_parts) <= 1:
-                    final_lines.append(line)
-                    continue
-
-                element_key = line_parts[0]
-
-                # Clear Logic for specified groups
-                if needs_clearing:
-                    # Set value to configured clear value ("" or "NA")
-                    # Note: \x1c is the field separator in SEL RDB
-                    cleared_line = f'{element_key},{config["clear_val"]}\x1c\n'
-                    final_lines.append(cleared_line)
-
-                # F1 Specific Logic (DP_NAM/DP_SIZE)
-                elif is_f1 and (line.startswith('DP_NAM') or line.startswith('DP_SIZE')):
-                    # Check if we have a comment in the original lookup to preserve?
-                    # Original code used the last 'element' loop variable, which was buggy.
-                    # We will append a generic closure or empty comment.
-                    cleared_line = f'{element_key},""\x1c\n'
-                    final_lines.append(cleared_line)
-
-                else:
-                    final_lines.append(line)
-        else:
-            final_lines = new_lines
+        final_lines = render_lines(lines, index_elements(lines), settings_group, wb_lookup, config)
 
         # Write back to file
         with open(file_path, 'w', encoding='ascii') as f:
             f.writelines(final_lines)
 
+    file_names = [file_name for file_name in os.listdir(target_dir)
+                  if file_name.lower().endswith('.txt') and parse_settings_group(file_name) not in excluded_regions]
+    if io_workers > 1 and len(file_names) > 1:
+        with ThreadPoolExecutor(max_workers=io_workers) as pool:
+            for _ in pool.map(process_file, file_names):  # re-raises the first error
+                pass
+    else:
+        for file_name in file_names:
+            process_file(file_name)
+
 
 if __name__ == '__main__':
     # Example usage
@@ -0,0 +1,94 @@
+"""
+Compact records for the generation pipeline.
+
+A fleet run holds a word bit per settings row per relay, so word bits and settings
+rows are __slots__ classes rather than dicts: no per-instance __dict__, and attribute
+access instead of string-keyed lookups in the render loop.
+
+Settings table columns are resolved once per table: every field sits at its
+historical position in the settings_* tables (SETTINGS_COLUMNS) except the
+Float flag, which has always been found by its header name.
+"""
+
+# field: column position in the settings_* tables
+SETTINGS_COLUMNS = {
+    'element': 0,
+    'value': 1,
+    'comment': 2,
+    'set_class': 5,
+    'logic_class': 6,
+    'qs_group': 8,
+}
+FLOAT_HEADER = 'Float'
+
+
+class WordBit:
+    """One RDB element assignment: ELEMENT,"VALUE"<0x1c>COMMENT in settings group qs_group (None = any group)"""
+    __slots__ = ('element', 'value', 'qs_group', 'comment')
+
+    def __init__(self, element, value, qs_group=None, comment=""):
+        self.element = element
+        self.value = value
+        self.qs_group = qs_group
+        self.comment = comment
+
+    def as_tuple(self):
+        return self.element, self.value, self.qs_group, self.comment
+
+    def __eq__(self, other):
+        if not isinstance(other, WordBit):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return f"WordBit({self.element!r}, {self.value!r}, {self.qs_group!r}, {self.comment!r})"
+
+
+class SettingsRow:
+    """One settings table row with its columns resolved (see resolve_columns)"""
+    __slots__ = ('element', 'value', 'comment', 'set_class', 'logic_class', 'qs_group', 'is_float')
+
+    def __init__(self, element, value, comment, set_class, logic_class, qs_group, is_float):
+        self.element = element
+        self.value = value
+        self.comment = comment
+        self.set_class = set_class
+        self.logic_class = logic_class
+        self.qs_group = qs_group
+        self.is_float = is_float
+
+    def __repr__(self):
+        return "SettingsRow({})".format(', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__))
+
+
+def resolve_columns(header):
+    """
+    Maps each SettingsRow field to its column index for a settings table header row.
+
+    Raises:
+        ValueError: when the table has no Float column
+    """
+    if FLOAT_HEADER not in header:
+        raise ValueError(f"Settings table has no column named '{FLOAT_HEADER}'")
+    return dict(SETTINGS_COLUMNS, is_float=list(header).index(FLOAT_HEADER))
+
+
+def read_settings_rows(settings):
+    """
+    Resolves a settings table (header row first, as read from the workbook) into SettingsRow records.
+
+    Returns:
+        list: one SettingsRow per data row, in table order (short rows read missing cells as None)
+    """
+    columns = resolve_columns(settings[0])
+    fields = [columns[name] for name in SettingsRow.__slots__]
+    width = max(fields) + 1
+    rows = []
+    for row in settings[1:]:
+        if len(row) < width:
+            row = list(row) + [None] * (width - len(row))
+        rows.append(SettingsRow(*[row[i] for i in fields]))
+    return rows
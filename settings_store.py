@@ -0,0 +1,242 @@
+"""
+SQLite settings store for fleet-scale queries.
+
+import_workbook() loads every relay type's class and settings tables (see
+rdb.RELAY_TYPES) into a local SQLite database, so later runs resolve word bits with
+index lookups instead of scanning the settings table:
+
+    relays           one row per class table row: rid, set_class, logic_token
+                     (the relay's logic class as matched by get_wordbits) and the
+                     full row (pickled, so cell types survive the round trip)
+    settings         one row per settings table row with an element: the word bit
+                     fields (value already formatted as compile_settings does) plus
+                     the raw set_class / logic_class cells
+    settings_logic   one row per (settings row, normalised logic class token) from the
+                     comma lists in the Logic Class column
+    sources          workbook path and SHA-256 per imported sheet
+
+Indexes cover settings class, logic class token, element and qs_group (each scoped to
+the sheet), and relay id. SettingsStore.get_wordbits(relay, sheet_name) returns exactly
+what rdb.get_wordbits returns for the same tables; gen_settings uses it with
+engine='sqlite'.
+
+Example:
+    python settings_store.py import settings.db Settings.xlsx
+    python settings_store.py which settings.db FDR_351S 50P1P
+"""
+import datetime
+import os
+import pickle
+import sqlite3
+import sys
+
+from rdb import RELAY_TYPES, compile_settings, identity_wordbits, open_relay_workbook, split_logic_classes
+from records import WordBit, read_settings_rows
+from table_cache import workbook_hash
+
+SCHEMA_VERSION = 1
+
+# Cell columns are declared without a type so SQLite keeps each value's own type (no affinity):
+# a settings class of 1.0 must not compare equal to '1', just as in the Python engines.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    sheet TEXT PRIMARY KEY, workbook TEXT, workbook_hash TEXT, imported TEXT, class_header BLOB
+);
+CREATE TABLE IF NOT EXISTS relays (
+    sheet TEXT, pos INTEGER, rid, set_class, logic_token TEXT, row BLOB, PRIMARY KEY (sheet, pos)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    sheet TEXT, pos INTEGER, element, value, value_type TEXT, qs_group, comment, set_class, logic_class,
+    PRIMARY KEY (sheet, pos)
+);
+CREATE TABLE IF NOT EXISTS settings_logic (
+    sheet TEXT, pos INTEGER, token TEXT, PRIMARY KEY (sheet, pos, token)
+);
+CREATE INDEX IF NOT EXISTS relays_rid ON relays (sheet, rid);
+CREATE INDEX IF NOT EXISTS settings_set_class ON settings (sheet, set_class, pos);
+CREATE INDEX IF NOT EXISTS settings_element ON settings (sheet, element);
+CREATE INDEX IF NOT EXISTS settings_qs_group ON settings (sheet, qs_group);
+CREATE INDEX IF NOT EXISTS settings_logic_token ON settings_logic (sheet, token, pos);
+"""
+
+# Settings rows that apply to a relay, in table order: unconditional rows, rows of its settings class and
+# rows listing its logic class (the three sources rdb.match_settings merges)
+MATCH_QUERY = """
+SELECT element, value, value_type, qs_group, comment FROM settings WHERE sheet = :sheet AND pos IN (
+    SELECT pos FROM settings WHERE sheet = :sheet AND set_class IS NULL AND logic_class IS NULL
+    UNION SELECT pos FROM settings WHERE sheet = :sheet AND set_class IS :set_class
+    UNION SELECT pos FROM settings_logic WHERE sheet = :sheet AND token = :logic_token
+) ORDER BY pos
+"""
+
+
+def encode_value(value):
+    """(stored value, value_type) for a word bit value; bools and datetimes are tagged so they come back as such"""
+    if isinstance(value, bool):
+        return int(value), 'bool'
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(), 'datetime'
+    return value, None
+
+
+def decode_value(value, value_type):
+    if value_type == 'bool':
+        return bool(value)
+    if value_type == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def logic_token(relay):
+    """The relay's logic class as get_wordbits matches it, or None"""
+    return str(relay[2]).split('.')[0] if relay[2] is not None else None
+
+
+def open_store(db_path):
+    """Opens (creating if needed) a settings store database"""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        conn.close()
+        raise ValueError(f"{db_path} is a settings store of version {version}; re-import it into a new file")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+
+def import_tables(conn, sheet_name, relay_class_rng, settings_rng, xl_path=None, content_hash=None):
+    """Replaces one sheet's rows in the store with the given class and settings tables (header rows first)"""
+    settings_rows = read_settings_rows(settings_rng)
+    word_bits = compile_settings(settings_rng, settings_rows=settings_rows)['rows']
+    with conn:
+        for table in ('sources', 'relays', 'settings', 'settings_logic'):
+            conn.execute(f"DELETE FROM {table} WHERE sheet = ?", (sheet_name,))
+        conn.execute("INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+                     (sheet_name, os.path.abspath(xl_path) if xl_path else None, content_hash,
+                      datetime.datetime.now().isoformat(timespec='seconds'),
+                      pickle.dumps(list(relay_class_rng[0]), protocol=pickle.HIGHEST_PROTOCOL)))
+        conn.executemany("INSERT INTO relays VALUES (?, ?, ?, ?, ?, ?)", (
+            (sheet_name, pos, relay[0], relay[1], logic_token(relay),
+             pickle.dumps(list(relay), protocol=pickle.HIGHEST_PROTOCOL))
+            for pos, relay in enumerate(relay_class_rng[1:]) if relay[0] is not None))
+        conn.executemany("INSERT INTO settings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            (sheet_name, pos, wb.element, *encode_value(wb.value), wb.qs_group, wb.comment, row.set_class,
+             None if row.logic_class is None else str(row.logic_class))
+            for pos, (row, wb) in enumerate(zip(settings_rows, word_bits)) if wb is not None))
+        conn.executemany("INSERT INTO settings_logic VALUES (?, ?, ?)", (
+            (sheet_name, pos, token)
+            for pos, row in enumerate(settings_rows) if row.element is not None and row.logic_class is not None
+            for token in dict.fromkeys(split_logic_classes(row.logic_class))))
+
+
+def import_workbook(db_path, xl_path, relay_types=None, backend=None, force=False, table_cache=None):
+    """
+    Loads each relay type's class and settings tables from the workbook into the store at db_path.
+    Sheets already imported from a workbook with the same contents are left alone unless force=True;
+    relay types whose tables are not in the workbook are reported and skipped.
+
+    Returns:
+        dict: {sheet name: number of relays imported} for the sheets (re)imported
+    """
+    content_hash = workbook_hash(xl_path)
+    conn = open_store(db_path)
+    imported = {}
+    try:
+        current = dict(conn.execute("SELECT sheet, workbook_hash FROM sources"))
+        wb = None
+        try:
+            for key in relay_types or RELAY_TYPES:
+                params = RELAY_TYPES[key]['params']
+                sheet_name = params['sheet_name']
+                if not force and current.get(sheet_name) == content_hash:
+                    continue
+                if wb is None:
+                    wb = open_relay_workbook(xl_path, backend, table_cache)
+                try:
+                    tables = wb.read_tables(sheet_name, [params['class_table'], params['settings_table']])
+                except Exception as e:
+                    print(f"Skipping {RELAY_TYPES[key]['label']}: {e}")
+                    continue
+                import_tables(conn, sheet_name, tables[params['class_table']], tables[params['settings_table']],
+                              xl_path, content_hash)
+                imported[sheet_name] = conn.execute("SELECT COUNT(*) FROM relays WHERE sheet = ?",
+                                                    (sheet_name,)).fetchone()[0]
+                print(f"Imported {sheet_name}: {imported[sheet_name]} relays")
+        finally:
+            if wb is not None:
+                wb.close()
+    finally:
+        conn.close()
+    return imported
+
+
+class SettingsStore:
+    """Read access to a settings store: relay rows, word bits and element queries"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = open_store(db_path)
+
+    def sheets(self):
+        return [sheet for sheet, in self.conn.execute("SELECT sheet FROM sources ORDER BY sheet")]
+
+    def relay_table(self, sheet_name, relay_ids=None):
+        """
+        The sheet's class table as gen_settings reads it: header row first, then the relays in table order
+        (only those in relay_ids when given; looked up by index).
+        """
+        header = self.conn.execute("SELECT class_header FROM sources WHERE sheet = ?", (sheet_name,)).fetchone()
+        if header is None:
+            raise ValueError(f"Sheet '{sheet_name}' has not been imported into {self.db_path}")
+        if relay_ids is None:
+            cursor = self.conn.execute("SELECT row FROM relays WHERE sheet = ? ORDER BY pos", (sheet_name,))
+        else:
+            relay_ids = list(relay_ids)
+            cursor = self.conn.execute(
+                f"SELECT row FROM relays WHERE sheet = ? AND rid IN ({', '.join('?' * len(relay_ids))}) "
+                "ORDER BY pos", (sheet_name, *relay_ids))
+        return [pickle.loads(header[0])] + [pickle.loads(row) for row, in cursor]
+
+    def match_settings(self, relay, sheet_name, include_comments=True):
+        """The relay's settings word bits, in table order (rdb.match_settings over the store)"""
+        cursor = self.conn.execute(MATCH_QUERY, {'sheet': sheet_name, 'set_class': relay[1],
+                                                 'logic_token': logic_token(relay)})
+        return [WordBit(element, decode_value(value, value_type), qs_group, comment if include_comments else "")
+                for element, value, value_type, qs_group, comment in cursor]
+
+    def get_wordbits(self, relay, sheet_name, pmu=True, mtr=False, dpac=False, include_comments=True):
+        """Identity word bits followed by the matched settings word bits, as rdb.get_wordbits returns them"""
+        word_bits = identity_wordbits(relay, pmu=pmu, mtr=mtr, dpac=dpac, include_comments=include_comments)
+        word_bits.extend(self.match_settings(relay, sheet_name, include_comments=include_comments))
+        return word_bits
+
+    def relays_with_element(self, sheet_name, element):
+        """Ids of the relays whose settings rows assign element (identity elements such as RID are not stored)"""
+        cursor = self.conn.execute("""
+            SELECT r.rid FROM relays r WHERE r.sheet = :sheet AND EXISTS (
+                SELECT 1 FROM settings s WHERE s.sheet = :sheet AND s.element = :element AND (
+                    (s.set_class IS NULL AND s.logic_class IS NULL) OR s.set_class IS r.set_class
+                    OR EXISTS (SELECT 1 FROM settings_logic l
+                               WHERE l.sheet = :sheet AND l.pos = s.pos AND l.token = r.logic_token)))
+            ORDER BY r.pos""", {'sheet': sheet_name, 'element': element})
+        return [rid for rid, in cursor]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['import'] and len(sys.argv) == 4:
+        import_workbook(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ['which'] and len(sys.argv) == 5:
+        with SettingsStore(sys.argv[2]) as store:
+            print('\n'.join(str(rid) for rid in store.relays_with_element(sys.argv[3], sys.argv[4])))
+    else:
+        sys.exit("usage: python settings_store.py import DB WORKBOOK\n"
+                 "       python settings_store.py which DB SHEET ELEMENT")
@@ -0,0 +1,163 @@
+"""
+On-disk cache of decoded workbook tables.
+
+Reading the class_* and settings_* tables is the slow part of every Preview and
+Generate, and the tables only change when the workbook does. CachedWorkbook wraps a
+workbook backend (see workbook.py) with the same interface: each table read is looked
+up in the cache first, and the workbook itself is only opened on a miss, so repeated
+runs against an unchanged workbook skip workbook parsing entirely (and, with the
+xlwings backend, never start Excel).
+
+Each table is one pickle file named after a hash of
+    (CACHE_VERSION, SHA-256 of the workbook's bytes, sheet name, table name)
+so editing and saving the workbook simply stops matching the old entries. Entries
+are touched on every hit; once the cache directory holds more than max_bytes the
+least recently used entries are removed.
+
+iter_table is passed through to the workbook uncached: its callers (streaming
+generation) rely on it not materialising the table.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+from workbook import open_workbook
+
+# Bumped when the pickled layout changes, so old entries are ignored (and evicted in time)
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.tbl'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.relay_settings', 'table_cache')
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+# (absolute path, size, mtime_ns) -> SHA-256, so a GUI session hashes an unchanged workbook once
+_content_hashes = {}
+
+
+def workbook_hash(xl_path):
+    """SHA-256 hex digest of the workbook file's contents"""
+    stat = os.stat(xl_path)
+    stamp = (os.path.abspath(xl_path), stat.st_size, stat.st_mtime_ns)
+    digest = _content_hashes.get(stamp)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(xl_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                sha.update(chunk)
+        digest = _content_hashes[stamp] = sha.hexdigest()
+    return digest
+
+
+def entry_name(content_hash, sheet_name, table_name):
+    key = repr((CACHE_VERSION, content_hash, sheet_name, table_name)).encode('utf-8')
+    return hashlib.sha256(key).hexdigest() + CACHE_SUFFIX
+
+
+def evict(cache_dir, max_bytes):
+    """Removes least recently used entries until the cache directory holds at most max_bytes"""
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith(CACHE_SUFFIX):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, file_name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, file_name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, file_name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+class CachedWorkbook:
+    """Workbook backend wrapper that serves read_table/read_tables from the table cache"""
+
+    def __init__(self, xl_path, backend=None, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.xl_path = xl_path
+        self.backend = backend
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.content_hash = workbook_hash(xl_path)
+        self._wb = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def workbook(self):
+        """The underlying workbook, opened on first use"""
+        if self._wb is None:
+            self._wb = open_workbook(self.xl_path, self.backend)
+        return self._wb
+
+    def _load(self, sheet_name, table_name):
+        path = os.path.join(self.cache_dir, entry_name(self.content_hash, sheet_name, table_name))
+        try:
+            with open(path, 'rb') as f:
+                rows = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # A truncated or foreign file: drop it and read the workbook instead
+            print(f"Ignoring unreadable table cache entry {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)  # mark as recently used for eviction
+        return rows
+
+    def _store(self, sheet_name, table_name, rows):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, entry_name(self.content_hash, sheet_name, table_name))
+            # Written under a temporary name and renamed, so a concurrent reader never sees half an entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            evict(self.cache_dir, self.max_bytes)
+        except OSError as e:
+            # The cache is an optimisation; a read-only or full disk must not fail the run
+            print(f"Could not write table cache entry for {sheet_name}/{table_name}: {e}")
+
+    def read_table(self, sheet_name, table_name):
+        return self.read_tables(sheet_name, [table_name])[table_name]
+
+    def read_tables(self, sheet_name, table_names):
+        tables = {}
+        missing = []
+        for table_name in table_names:
+            rows = self._load(sheet_name, table_name)
+            if rows is None:
+                missing.append(table_name)
+            else:
+                tables[table_name] = rows
+        self.hits += len(tables)
+        self.misses += len(missing)
+        if missing:
+            read = self.workbook.read_tables(sheet_name, missing)
+            for table_name in missing:
+                self._store(sheet_name, table_name, read[table_name])
+            tables.update(read)
+        return tables
+
+    def iter_table(self, sheet_name, table_name):
+        return self.workbook.iter_table(sheet_name, table_name)
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
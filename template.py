@@ -0,0 +1,460 @@
+"""
+In-memory model of an SEL RDB template directory.
+
+compile_template() reads the template once: every top-level .txt settings file is
+split into lines, indexed by element and tagged with the settings group parsed from
+its file name. render_template() then writes a relay's output directory straight
+from memory, one write per file, instead of copying the template and rewriting it.
+Files that come out identical to the template are cloned rather than written.
+write_relay_archive()/render_archive() stream the same rendered output into zip archives.
+"""
+import io
+import os
+import posixpath
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from events import PhaseTimer
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl request to share a file's extents copy-on-write (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+
+def parse_settings_group(file_name):
+    """Parse Group from filename (e.g., 'SET_1.TXT' -> '1')"""
+    parts = file_name.split('_')
+    if len(parts) > 1:
+        return parts[1].split('.')[0]
+    return "UNKNOWN"
+
+
+def index_elements(lines):
+    """Maps each element name to the line indices it appears on: {'50P1P': [12], ...}"""
+    elements = {}
+    for idx, line in enumerate(lines):
+        elements.setdefault(line.split(',')[0], []).append(idx)
+    return elements
+
+
+def encode_lines(lines):
+    """Bytes that writing `lines` to a file opened with open(path, 'w', encoding='ascii') produces"""
+    return ''.join(lines).replace('\n', os.linesep).encode('ascii')
+
+
+def _is_verbatim(raw, lines):
+    try:
+        return raw == encode_lines(lines)
+    except UnicodeEncodeError:
+        return False
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        return False
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(dst)
+    return False
+
+
+def _copy_file_range(src, dst):
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        if remaining > 0:
+            raise OSError("copy_file_range stopped short")
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def clone_file(src, dst, hardlink=False):
+    """
+    Materialises an unchanged template file at dst without pushing its bytes through Python.
+    Tries, in order: hardlink (only when requested), reflink, copy_file_range, then a regular copy.
+
+    Returns:
+        str: the method used ('hardlink', 'reflink', 'copy_file_range' or 'copy')
+    """
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+    if _reflink(src, dst):
+        shutil.copystat(src, dst)
+        return 'reflink'
+    if _copy_file_range(src, dst):
+        shutil.copystat(src, dst)
+        return 'copy_file_range'
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def _read_template_file(file_path):
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    # Decoded once from the same bytes, as open(file_path, 'r') reads it: default encoding, universal newlines
+    lines = io.TextIOWrapper(io.BytesIO(raw)).readlines()
+    return raw, lines
+
+
+def compile_template(template_path, io_workers=1):
+    """
+    Parses a template directory once. io_workers > 1 reads that many settings files at once.
+
+    Returns:
+        dict: {'path': template_path,
+               'files': [{'name': 'SET_1.TXT', 'group': '1', 'lines': [...], 'elements': {...},
+                          'verbatim': True if writing the unmodified lines reproduces the file byte for byte}, ...],
+               'copies': [relative paths copied verbatim (non-.txt files, files in sub-folders)],
+               'dirs': [relative sub-folder paths],
+               'bytes_read': size of the settings files parsed}
+    """
+    compiled = {'path': template_path, 'files': [], 'copies': [], 'dirs': [], 'bytes_read': 0}
+    settings_files = []
+
+    for root, dirs, files in os.walk(template_path):
+        rel_root = os.path.relpath(root, template_path)
+        dirs.sort()
+        for dir_name in dirs:
+            compiled['dirs'].append(os.path.normpath(os.path.join(rel_root, dir_name)))
+
+        for file_name in sorted(files):
+            rel_path = os.path.normpath(os.path.join(rel_root, file_name))
+            if rel_root != '.' or not file_name.lower().endswith('.txt'):
+                compiled['copies'].append(rel_path)
+                continue
+            settings_files.append(file_name)
+
+    paths = [os.path.join(template_path, file_name) for file_name in settings_files]
+    if io_workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=io_workers) as pool:
+            contents = list(pool.map(_read_template_file, paths))
+    else:
+        contents = [_read_template_file(path) for path in paths]
+
+    for file_name, (raw, lines) in zip(settings_files, contents):
+        compiled['bytes_read'] += len(raw)
+        compiled['files'].append({
+            'name': file_name,
+            'group': parse_settings_group(file_name),
+            'lines': lines,
+            'elements': index_elements(lines),
+            'verbatim': _is_verbatim(raw, lines),
+        })
+
+    return compiled
+
+
+def group_key(qs_group):
+    """Normalises a word bit's settings group to match file name groups: 1.0 -> '1', 'D1' -> 'D1', None -> None"""
+    if qs_group is None:
+        return None
+    if isinstance(qs_group, float) and qs_group.is_integer():
+        return str(int(qs_group))
+    return str(qs_group)
+
+
+def build_wordbit_lookup(word_bits):
+    """
+    Partitions word bits by settings group, built once per relay.
+
+    Returns:
+        dict: {settings group: {element: WordBit}}. Bits without a qs_group live under None and
+        apply to any group that has no value of its own for that element. Within a partition the
+        last word bit for an element wins.
+    """
+    wb_lookup = {}
+    for wb in word_bits:
+        wb_lookup.setdefault(group_key(wb.qs_group), {})[wb.element] = wb
+    return wb_lookup
+
+
+def format_line(wb):
+    """SEL RDB format: ELEMENT,"VALUE"<0x1c>COMMENT"""
+    return f'{wb.element},"{wb.value}"\x1c{wb.comment}\n'
+
+
+def render_lines(lines, elements, settings_group, wb_lookup, config, stats=None, sources=None):
+    """
+    Applies word bits and the group clearing rules to one settings file.
+
+    Args:
+        lines (list): template lines
+        elements (dict): index_elements(lines)
+        settings_group (str): group parsed from the file name
+        wb_lookup (dict): build_wordbit_lookup(word_bits), partitioned by settings group
+        config (dict): entry of rdb.DEVICE_CONFIGS
+        stats (dict): optional; 'replaced' and 'cleared' are set to the number of lines changed by each pass
+        sources (dict): optional; filled with {line index: the WordBit written there}
+
+    Returns:
+        list: rendered lines
+    """
+    new_lines = list(lines)
+    found_indices = set()
+    group_bits = wb_lookup.get(settings_group, {})
+    any_group_bits = wb_lookup.get(None, {})
+
+    # PASS 1: Update values from Word Bits
+    for element_key, indices in elements.items():
+        # Check if this element exists in our Excel data, preferring a value for this group
+        wb = group_bits.get(element_key) or any_group_bits.get(element_key)
+        if wb is None:
+            continue
+
+        # Only update if we have a value
+        if wb.value:
+            new_line = format_line(wb)
+            for idx in indices:
+                new_lines[idx] = new_line
+                found_indices.add(idx)
+                if sources is not None:
+                    sources[idx] = wb
+
+    # PASS 2: Clear Logic (D1, L1... or F1 specific handling)
+    # Determine if this file needs clearing logic
+    needs_clearing = settings_group in config['clear_groups']
+    is_f1 = (settings_group == 'F1') and config['process_f1']
+
+    if stats is not None:
+        stats['replaced'] = len(found_indices)
+        stats['cleared'] = 0
+
+    if not (needs_clearing or is_f1):
+        return new_lines
+
+    final_lines = []
+    for idx, line in enumerate(new_lines):
+        # Skip lines we just updated
+        if idx in found_indices:
+            final_lines.append(line)
+            continue
+
+        line_parts = line.split(',')
+        if len(line_parts) <= 1:
+            final_lines.append(line)
+            continue
+
+        element_key = line_parts[0]
+
+        # Clear Logic for specified groups
+        if needs_clearing:
+            # Set value to configured clear value ("" or "NA")
+            # Note: \x1c is the field separator in SEL RDB
+            cleared_line = f'{element_key},{config["clear_val"]}\x1c\n'
+            final_lines.append(cleared_line)
+            if stats is not None:
+                stats['cleared'] += 1
+
+        # F1 Specific Logic (DP_NAM/DP_SIZE)
+        elif is_f1 and (line.startswith('DP_NAM') or line.startswith('DP_SIZE')):
+            # Check if we have a comment in the original lookup to preserve?
+            # Original code used the last 'element' loop variable, which was buggy.
+            # We will append a generic closure or empty comment.
+            cleared_line = f'{element_key},""\x1c\n'
+            final_lines.append(cleared_line)
+            if stats is not None:
+                stats['cleared'] += 1
+
+        else:
+            final_lines.append(line)
+
+    return final_lines
+
+
+def class_key(relay, identity_bits):
+    """
+    Relays with equal keys render identically apart from their identity lines: same settings class,
+    same logic class token (the only relay fields match_settings reads) and the same identity elements,
+    each either set or empty.
+    """
+    logic_class = str(relay[2]).split('.')[0] if relay[2] is not None else None
+    return relay[1], logic_class, tuple((wb.element, bool(wb.value)) for wb in identity_bits)
+
+
+def render_class(compiled, word_bits, identity_count, excluded_regions, config):
+    """
+    Renders a settings class once for every relay that shares its class_key.
+    word_bits is one member relay's full word bit list, whose first identity_count bits are its identity bits.
+
+    Returns:
+        dict: {'identity_count': identity_count,
+               'files': {file name: None for excluded files, else
+                         {'lines': rendered lines, 'stats': render stats,
+                          'patches': [(line index, identity bit position), ...],
+                          'base_unchanged': True if every non-identity line matches the template}}}
+    """
+    if excluded_regions is None:
+        excluded_regions = []
+    identity_bits = word_bits[:identity_count]
+    wb_lookup = build_wordbit_lookup(word_bits)
+    rendered = {'identity_count': identity_count, 'files': {}}
+    for template_file in compiled['files']:
+        if template_file['group'] in excluded_regions:
+            rendered['files'][template_file['name']] = None
+            continue
+        stats = {}
+        sources = {}
+        final_lines = render_lines(template_file['lines'], template_file['elements'], template_file['group'],
+                                   wb_lookup, config, stats, sources)
+        patches = [(idx, k) for idx, wb in sources.items()
+                   for k, identity_bit in enumerate(identity_bits) if wb is identity_bit]
+        patched = {idx for idx, _ in patches}
+        base_unchanged = template_file['verbatim'] and len(final_lines) == len(template_file['lines']) and all(
+            line == template_line for idx, (line, template_line) in enumerate(zip(final_lines, template_file['lines']))
+            if idx not in patched)
+        rendered['files'][template_file['name']] = {'lines': final_lines, 'stats': stats, 'patches': patches,
+                                                    'base_unchanged': base_unchanged}
+    return rendered
+
+
+def iter_relay_files(compiled, word_bits, excluded_regions, config, emit=None, class_render=None):
+    """
+    Renders one relay's output file by file. Shared by the directory and archive writers.
+    emit: optional events.relay_emitter(...) callable; a 'render' event is sent per settings file.
+    class_render: optional render_class(...) result for the relay's class_key; the relay's files are then
+    copies of the class render with only the identity lines patched.
+
+    Yields:
+        tuple: (path relative to the relay folder, rendered lines), where lines is None when the
+        template file is reused unchanged (excluded region, no replacements, or not a settings file)
+    """
+    if excluded_regions is None:
+        excluded_regions = []
+
+    for rel_path in compiled['copies']:
+        yield rel_path, None
+
+    if class_render is not None:
+        yield from _iter_patched_files(compiled, word_bits[:class_render['identity_count']], class_render, emit)
+        return
+
+    wb_lookup = build_wordbit_lookup(word_bits)
+    for template_file in compiled['files']:
+        if template_file['group'] in excluded_regions:
+            yield template_file['name'], None
+            continue
+
+        stats = {}
+        with PhaseTimer() as timer:
+            final_lines = render_lines(template_file['lines'], template_file['elements'], template_file['group'],
+                                       wb_lookup, config, stats)
+            unchanged = template_file['verbatim'] and final_lines == template_file['lines']
+        if emit is not None:
+            emit('render', file=template_file['name'], elapsed=timer.elapsed,
+                 lines_replaced=stats['replaced'], lines_cleared=stats['cleared'])
+
+        yield template_file['name'], None if unchanged else final_lines
+
+
+def _iter_patched_files(compiled, identity_bits, class_render, emit):
+    for template_file in compiled['files']:
+        rendered = class_render['files'][template_file['name']]
+        if rendered is None:
+            yield template_file['name'], None
+            continue
+
+        with PhaseTimer() as timer:
+            final_lines = rendered['lines']
+            unchanged = rendered['base_unchanged']
+            if rendered['patches']:
+                final_lines = list(final_lines)
+                for idx, k in rendered['patches']:
+                    final_lines[idx] = format_line(identity_bits[k])
+                    unchanged = unchanged and final_lines[idx] == template_file['lines'][idx]
+        if emit is not None:
+            emit('render', file=template_file['name'], elapsed=timer.elapsed,
+                 lines_replaced=rendered['stats']['replaced'], lines_cleared=rendered['stats']['cleared'])
+
+        yield template_file['name'], None if unchanged else final_lines
+
+
+def render_template(compiled, new_dir, word_bits, excluded_regions, config, hardlink=False, emit=None,
+                    class_render=None):
+    """
+    Writes one relay's RDB directory from a compiled template.
+    Only settings files that differ from the template are written. Files in excluded regions, files that
+    receive no replacements, other files and sub-folders are cloned from the template (see clone_file).
+    hardlink=True links unchanged files to the template instead; don't edit such outputs in place.
+    emit: optional events.relay_emitter(...) callable receiving 'directory', 'render' and 'write' events.
+    class_render: optional render_class(...) result shared by relays of the same class (see iter_relay_files).
+    """
+    with PhaseTimer() as timer:
+        if os.path.exists(new_dir):
+            shutil.rmtree(new_dir)
+        os.makedirs(new_dir)
+        for rel_dir in compiled['dirs']:
+            os.makedirs(os.path.join(new_dir, rel_dir), exist_ok=True)
+    if emit is not None:
+        emit('directory', elapsed=timer.elapsed)
+
+    for rel_path, lines in iter_relay_files(compiled, word_bits, excluded_regions, config, emit, class_render):
+        file_path = os.path.join(new_dir, rel_path)
+        with PhaseTimer() as timer:
+            if lines is None:
+                method = clone_file(os.path.join(compiled['path'], rel_path), file_path, hardlink)
+            else:
+                method = 'write'
+                with open(file_path, 'w', encoding='ascii') as f:
+                    f.writelines(lines)
+        if emit is not None:
+            emit('write', file=rel_path, elapsed=timer.elapsed, bytes_written=os.path.getsize(file_path),
+                 method=method)
+
+    return new_dir
+
+
+def write_relay_archive(compiled, zip_file, word_bits, excluded_regions, config, prefix='', emit=None,
+                        class_render=None):
+    """
+    Streams one relay's rendered files into an open zipfile.ZipFile without touching the disk.
+    prefix places the files in a folder inside the archive (e.g. the relay ID in a fleet archive).
+    """
+    def arcname(rel_path):
+        return posixpath.join(prefix, rel_path.replace(os.sep, '/'))
+
+    for rel_dir in compiled['dirs']:
+        zip_file.writestr(arcname(rel_dir) + '/', b'')
+
+    for rel_path, lines in iter_relay_files(compiled, word_bits, excluded_regions, config, emit, class_render):
+        with PhaseTimer() as timer:
+            if lines is None:
+                source_path = os.path.join(compiled['path'], rel_path)
+                zip_file.write(source_path, arcname(rel_path))
+                size = os.path.getsize(source_path)
+            else:
+                data = encode_lines(lines)
+                zip_file.writestr(arcname(rel_path), data)
+                size = len(data)
+        if emit is not None:
+            emit('write', file=rel_path, elapsed=timer.elapsed, bytes_written=size, method='archive')
+
+
+def render_archive(compiled, zip_path, word_bits, excluded_regions, config, emit=None, class_render=None):
+    """Writes one relay's RDB files into their own .zip archive"""
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        write_relay_archive(compiled, zip_file, word_bits, excluded_regions, config, emit=emit,
+                            class_render=class_render)
+    return zip_path
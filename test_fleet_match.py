@@ -0,0 +1,50 @@
+"""
+The 'matrix' engine (fleet_match.get_fleet_wordbits) must give exactly what rdb.get_wordbits gives
+per relay. Run with: python -m pytest test_fleet_match.py
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bench import make_tables
+from fleet_match import get_fleet_wordbits
+from rdb import get_wordbits
+
+ELEMENTS = [f'E{i}' for i in range(40)] + ['RID', 'TID', 'IPADDR']
+GROUPS = ['1', '2', '3', 'L1', 'D1']
+
+
+def fleet_tables():
+    """bench tables plus the awkward class values the workbooks hold: None, floats, strings and comma lists"""
+    class_table, settings_table = make_tables(relays=60, settings_rows=400, settings_classes=4, logic_classes=6,
+                                              logic_fanout=3, float_ratio=0.3, elements=ELEMENTS, groups=GROUPS,
+                                              seed=7)
+    class_table[1][1] = None        # no settings class: matches rows without one
+    class_table[2][2] = None        # no logic class
+    class_table[3][1:3] = [None, None]
+    class_table[4][2] = '2'         # logic class typed as text
+    class_table[5][2] = '3.0'
+    class_table[6][2] = 4           # and as an int
+    class_table[7][1:3] = ['S99', 99.0]  # a class no settings row names
+
+    settings_table[1][5:7] = [None, None]  # unconditional row
+    settings_table[2][6] = 2.0             # single float logic class
+    settings_table[3][6] = '1.0,3'         # comma list with a float token and no space
+    settings_table[4][6] = ' 4 , 5 '
+    settings_table[5][0] = None            # no element: never selected
+    settings_table[6][5:7] = [None, '2']
+    return class_table, settings_table
+
+
+@pytest.mark.parametrize('options', [{}, {'include_comments': False}, {'pmu': False, 'mtr': True},
+                                     {'dpac': True}])
+def test_matrix_engine_matches_get_wordbits(options):
+    class_table, settings_table = fleet_tables()
+    relays = class_table[1:]
+    expected = [get_wordbits(relay, settings_table, **options) for relay in relays]
+    assert get_fleet_wordbits(relays, settings_table, **options) == expected
+
+
+def test_matrix_engine_empty_fleet():
+    _, settings_table = fleet_tables()
+    assert get_fleet_wordbits([], settings_table) == []
@@ -1,7 +1,8 @@
 
-import tkinter as tk
-from tkinter import filedialog
-import xlwings as xw
+import argparse
+import os
+import sys
+from copy import deepcopy
 from docx import Document
 from docx.shared import Pt
 from docx.shared import RGBColor
@@ -11,8 +12,13 @@ from docx.enum.table import WD_ALIGN_VERTICAL
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from docx.shared import Inches
+from docx.table import _Cell
+from lxml.etree import SubElement
 from natsort import natsorted
 import re
+from rdb import RELAY_TYPES, open_relay_workbook, split_logic_classes
+from table_cache import DEFAULT_CACHE_DIR
+from workbook import BACKENDS
 
 burgundy = [112, 17, 13]
 three_col_widths = [1.25, 2.88, 2.88]
@@ -41,36 +47,68 @@ def set_cell_style(cell, style):
         cell.paragraphs[0].runs[0].bold = True
 
 
+def format_cell(cell, font_color, col_width):
+    """The body cell formatting of the report tables, applied through python-docx one cell at a time"""
+    cell.width = Inches(col_width)
+    cell.paragraphs[0].runs[0].bold = False
+    cell.paragraphs[0].runs[0].font.size = Pt(12.0)
+    cell.paragraphs[0].runs[0].font.color.rgb = RGBColor(font_color[0], font_color[1], font_color[2])
+    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+    cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
+
+
+def cell_prototypes(docx_table, font_color, col_widths):
+    """
+    One formatted, empty <w:tc> per column: a copy of the table's first cell put through format_cell,
+    so the prototypes carry exactly the XML the per-cell path produces.
+    """
+    prototypes = []
+    for col_width in col_widths:
+        tc = deepcopy(docx_table._tbl.tr_lst[0].tc_lst[0])
+        cell = _Cell(tc, docx_table)
+        cell.text = ''
+        format_cell(cell, font_color, col_width)
+        prototypes.append(tc)
+    return prototypes
+
+
+def fill_rows(docx_table, rows, font_color, col_widths, first_row=0, blank_empty=False):
+    """
+    Writes rows into the table's rows from first_row on in one pass: each cell is a copy of its column's
+    prototype with only the run text set. Cells past the end of a row are left as they are.
+    blank_empty writes '' for falsy values instead of str(value).
+    """
+    if not rows:
+        return
+    prototypes = cell_prototypes(docx_table, font_color, col_widths)
+    for tr, row in zip(docx_table._tbl.tr_lst[first_row:], rows):
+        tcs = tr.tc_lst
+        for j, value in enumerate(row):
+            tc = deepcopy(prototypes[j])
+            set_run_text(tc[-1][-1], str(value) if value or not blank_empty else '')  # <w:tc><w:p><w:r>
+            tr.replace(tcs[j], tc)
+
+
+def set_run_text(r, text):
+    """CT_R.text for an empty run, with the common case (no tabs or line breaks: a single <w:t>) inlined"""
+    if not text:
+        return
+    if '\t' in text or '\n' in text or '\r' in text:
+        r.text = text
+        return
+    t = SubElement(r, qn('w:t'))
+    t.text = text
+    if len(text.strip()) < len(text):
+        t.set(qn('xml:space'), 'preserve')
+
+
 def set_table(docx_table, filtered_settings, header_names, font_color, col_widths):
     set_header_row(docx_table, header_names, font_color, col_widths)
-    for i, row in enumerate(filtered_settings):
-        row_cells = docx_table.rows[i + 1].cells
-        for j, value in enumerate(row):
-            row_cells[j].text = str(value)
-            # Apply formatting from Excel (e.g., font size)
-            row_cells[j].width = Inches(col_widths[j])
-            row_cells[j].paragraphs[0].runs[0].bold = False
-            row_cells[j].paragraphs[0].runs[0].font.size = Pt(12.0)
-            row_cells[j].paragraphs[0].runs[0].font.color.rgb = RGBColor(font_color[0], font_color[1], font_color[2])
-            row_cells[j].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-            row_cells[j].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
+    fill_rows(docx_table, filtered_settings, font_color, col_widths, first_row=1)
 
 
 def set_table_no_headers(docx_table, filtered_settings, font_color, col_widths):
-    for i, row in enumerate(filtered_settings):
-        row_cells = docx_table.rows[i].cells
-        for j, value in enumerate(row):
-            if value:
-                row_cells[j].text = str(value)
-            else:
-                row_cells[j].text = ''
-            # Apply formatting from Excel (e.g., font size)
-            row_cells[j].width = Inches(col_widths[j])
-            row_cells[j].paragraphs[0].runs[0].bold = False
-            row_cells[j].paragraphs[0].runs[0].font.size = Pt(12.0)
-            row_cells[j].paragraphs[0].runs[0].font.color.rgb = RGBColor(font_color[0], font_color[1], font_color[2])
-            row_cells[j].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-            row_cells[j].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
+    fill_rows(docx_table, filtered_settings, font_color, col_widths, blank_empty=True)
 
 
 def set_table_title(doc, table_title):
@@ -344,83 +382,252 @@ def create_oc_table(docx, column_count, style, page_align, autofit, data, font_c
             cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
 
 
-def gen_351S():
+# --- Report API ---
+REPORT_SHEET = 'FeederLogic'
+REPORT_TABLES = ('io_351S', 'settings_351S', 'PH_OC_1', 'PH_OC_2')
+# Base document of the interactive gen_351S; batch runs always name their template
+DEFAULT_TEMPLATE = r"C:\Users\laerps\OneDrive - Westwood Active Directory\Desktop\351S\Relay Settings Report - Stripped.docx"
+REPORT_MODES = ('relay', 'class')
+# The report tables are the 351S ones, so only 351S relay types can be reported on
+REPORT_RELAY_TYPES = ('feeder', 'hv')
+
+
+def read_report_tables(wb, sheet_name=REPORT_SHEET):
+    """Reads the report tables (REPORT_TABLES) from an open workbook in a single pass"""
+    return wb.read_tables(sheet_name, list(REPORT_TABLES))
+
+
+# Report settings table columns that tie a row to relay classes
+REPORT_CLASS_COLUMNS = ('Settings Class', 'Logic Class')
+
+
+def has_class_columns(settings_table):
+    return any(name in settings_table[0] for name in REPORT_CLASS_COLUMNS)
+
+
+def relay_report_settings(settings_table, relay):
+    """
+    The settings table rows (header first) that apply to a relay, matched on the 'Settings Class' and
+    'Logic Class' columns as rdb.get_wordbits matches them. Tables without those columns apply as a whole.
+    """
+    header = settings_table[0]
+    if not has_class_columns(settings_table):
+        return settings_table
+    set_idx = header.index('Settings Class') if 'Settings Class' in header else None
+    logic_idx = header.index('Logic Class') if 'Logic Class' in header else None
+    logic_token = str(relay[2]).split('.')[0] if relay[2] is not None else None
+    rows = [header]
+    for row in settings_table[1:]:
+        set_class = row[set_idx] if set_idx is not None else None
+        logic_class = row[logic_idx] if logic_idx is not None else None
+        if ((set_class is None and logic_class is None) or set_class == relay[1]
+                or (logic_token is not None and logic_class is not None
+                    and logic_token in split_logic_classes(logic_class))):
+            rows.append(row)
+    return rows
+
+
+def build_report(doc, tables, name='11F', settings=None):
+    """
+    Appends the 351S settings report to a document.
+
+    Args:
+        doc: python-docx Document (the base template)
+        tables (dict): read_report_tables(...) result
+        name (str): relay name used in the section headings
+        settings (list): settings table to report (header first); tables['settings_351S'] when omitted
+    """
+    main_settings_351S = tables['settings_351S'] if settings is None else settings
+
+    doc.add_heading(f'{name} Input/Output Summary', level=2)
+    create_io_table(doc, 2, std_tbl_style, WD_TABLE_ALIGNMENT.LEFT, True, tables['io_351S'], burgundy, [2, 2])
+    doc.add_paragraph()
+
+    doc.add_heading('Feeder PH OC Settings', level=2)
+    create_oc_table(doc, 4, std_tbl_style, WD_TABLE_ALIGNMENT.LEFT, True, tables['PH_OC_1'], burgundy, [1, 1, 1, 1])
+    doc.add_paragraph()
+    create_oc_table(doc, 4, std_tbl_style, WD_TABLE_ALIGNMENT.LEFT, True, tables['PH_OC_2'], burgundy, [1, 1, 1, 1])
+    doc.add_paragraph()
+
+    doc.add_heading('Voltage and Frequency', level=3)
+    filtered_settings = filter_settings(main_settings_351S, 'V/Freq Protection', filter_column='Function',
+                                        all_columns=True)
+    volt_freq_settings = reorg_vfreq_summary(filtered_settings)
+    create_vfreq_table(doc, 6, std_tbl_style, std_tbl_pg_align, True, volt_freq_settings, burgundy, [2, 1, 1, 1, 1, 1])
+
+    # Add a heading to section
+    doc.add_heading(f'{name} Logic', level=2)
+    doc.add_paragraph(text='The table below outlines the major settings used in the feeder relay.')
+
+    filtered_settings = filter_settings(main_settings_351S, 'Global')
+    create_settings_group_table(doc, 'Global', 3, std_tbl_style, std_tbl_pg_align,
+                                False, filtered_settings, std_three_col_names, burgundy, three_col_widths)
+
+    filtered_settings = filter_settings(main_settings_351S, 'Trip Logic')
+    create_settings_group_table(doc, 'Trip Logic', 3, std_tbl_style, std_tbl_pg_align,
+                                False, filtered_settings, std_three_col_names, burgundy, three_col_widths)
+
+    filtered_settings = filter_settings(main_settings_351S, 'SELogic Variables')
+    sel_vars = reorg_sel_vars(filtered_settings)
+    create_settings_group_table(doc, 'SELogic Variables', 5, std_tbl_style, std_tbl_pg_align, False,
+                                sel_vars, ['Element', 'Logic', 'PU (cyc)', 'DO (cyc)', 'Description'],
+                                burgundy, [0.75, 2.5, 0.75, 0.75, 2.25])
+
+    filtered_settings = filter_settings(main_settings_351S, 'Latch Bits')
+    latch_bits = reorg_latch(filtered_settings)
+    create_settings_group_table(doc, 'Latch Bits', 4, std_tbl_style, std_tbl_pg_align, False,
+                                latch_bits, ['Element', 'Set', 'Reset', 'Description'],
+                                burgundy, [0.75, 2, 2, 2.25])
+
+    filtered_settings = filter_settings(main_settings_351S, 'Display Points')
+    display_points = reorg_display(filtered_settings)
+    create_settings_group_table(doc, 'Display Points', 5, std_tbl_style, std_tbl_pg_align, False,
+                                display_points, ['Element', 'Logic', 'Set Message', 'Clear Message', 'Description'],
+                                burgundy, [0.75, 1.33, 1.33, 1.33, 2.25])
+
+
+class ReportTemplate:
+    """
+    The base .docx parsed once and reused for every report: each report is appended to the body, saved,
+    and the body is then restored to the elements the template started with.
+    """
+
+    def __init__(self, template_path):
+        self.doc = Document(template_path)
+        self._body = self.doc.element.body
+        self._base = list(self._body)
+
+    def render(self, save_path, tables, name='11F', settings=None):
+        try:
+            build_report(self.doc, tables, name, settings)
+            self.doc.save(save_path)
+        finally:
+            self.restore()
+        return save_path
+
+    def restore(self):
+        base = set(self._base)
+        for child in list(self._body):
+            if child not in base:
+                self._body.remove(child)
+
+
+def report_file_name(name):
+    return re.sub(r'[^\w.-]+', '_', str(name)).strip('_') + '.docx'
+
+
+def gen_reports(xl_path, template_path, output_path, relay_type='feeder', per='relay', backend=None,
+                table_cache=None, relay_ids=None):
+    """
+    Writes a settings report per relay (<RID>.docx) or per relay class (class_<set>_<logic>.docx) of a
+    relay type to output_path without any dialogs. The workbook is read once and the base template is
+    parsed once.
+    relay_type: one of REPORT_RELAY_TYPES; its class table lists the relays
+    relay_ids: optional relay ids to report on; with per='class' only their classes are reported
+
+    Returns: List of dictionaries [{'name': 'Relay1', 'relays': ['Relay1'], 'path': '...', 'error': None}, ...]
+    """
+    if per not in REPORT_MODES:
+        raise ValueError(f"Unknown report mode '{per}'. Choose from: {', '.join(REPORT_MODES)}")
+    if relay_type not in REPORT_RELAY_TYPES:
+        raise ValueError(f"Reports are built from the 351S tables on {REPORT_SHEET}; relay type '{relay_type}' "
+                         f"is not supported. Choose from: {', '.join(REPORT_RELAY_TYPES)}")
+
+    wb = open_relay_workbook(xl_path, backend, table_cache)
     try:
-        # Open the Excel file and select the sheet
-        root = tk.Tk()
-        root.withdraw()
-
-        app = xw.App(visible=False)
-        xl_path = filedialog.askopenfilename(title="Select a file")
-        wb = app.books.open(xl_path)
-        sheet = wb.sheets['FeederLogic']
-
-        # Read the settings
-        io_351S = sheet.tables['io_351S'].range.value  # Access named table range directly
-        main_settings_351S = sheet.tables['settings_351S'].range.value  # Access named table range directly
-        ph_oc_1 = sheet.tables['PH_OC_1'].range.value  # Access named table range directly
-        ph_oc_2 = sheet.tables['PH_OC_2'].range.value  # Access named table range directly
-
-        # Create a Word document
-        doc = Document(
-            r"C:\Users\laerps\OneDrive - Westwood Active Directory\Desktop\351S\Relay Settings Report - Stripped.docx")
-
-        doc.add_heading('11F Input/Output Summary', level=2)
-        create_io_table(doc, 2, std_tbl_style, WD_TABLE_ALIGNMENT.LEFT, True, io_351S, burgundy, [2, 2])
-        doc.add_paragraph()
-
-        doc.add_heading('Feeder PH OC Settings', level=2)
-        create_oc_table(doc, 4, std_tbl_style, WD_TABLE_ALIGNMENT.LEFT, True, ph_oc_1, burgundy, [1, 1, 1, 1])
-        doc.add_paragraph()
-        create_oc_table(doc, 4, std_tbl_style, WD_TABLE_ALIGNMENT.LEFT, True, ph_oc_2, burgundy, [1, 1, 1, 1])
-        doc.add_paragraph()
-
-        doc.add_heading('Voltage and Frequency', level=3)
-        filtered_settings = filter_settings(main_settings_351S, 'V/Freq Protection', filter_column='Function',
-                                            all_columns=True)
-        volt_freq_settings = reorg_vfreq_summary(filtered_settings)
-        create_vfreq_table(doc, 6, std_tbl_style, std_tbl_pg_align, True, volt_freq_settings, burgundy, [2, 1, 1, 1, 1, 1])
-
-        # Add a heading to section
-        doc.add_heading('11F Logic', level=2)
-        doc.add_paragraph(text='The table below outlines the major settings used in the feeder relay.')
-
-        filtered_settings = filter_settings(main_settings_351S, 'Global')
-        create_settings_group_table(doc, 'Global', 3, std_tbl_style, std_tbl_pg_align,
-                                    False, filtered_settings, std_three_col_names, burgundy, three_col_widths)
-
-        filtered_settings = filter_settings(main_settings_351S, 'Trip Logic')
-        create_settings_group_table(doc, 'Trip Logic', 3, std_tbl_style, std_tbl_pg_align,
-                                    False, filtered_settings, std_three_col_names, burgundy, three_col_widths)
-
-        filtered_settings = filter_settings(main_settings_351S, 'SELogic Variables')
-        sel_vars = reorg_sel_vars(filtered_settings)
-        create_settings_group_table(doc, 'SELogic Variables', 5, std_tbl_style, std_tbl_pg_align, False,
-                                    sel_vars, ['Element', 'Logic', 'PU (cyc)', 'DO (cyc)', 'Description'],
-                                    burgundy, [0.75, 2.5, 0.75, 0.75, 2.25])
-
-        filtered_settings = filter_settings(main_settings_351S, 'Latch Bits')
-        latch_bits = reorg_latch(filtered_settings)
-        create_settings_group_table(doc, 'Latch Bits', 4, std_tbl_style, std_tbl_pg_align, False,
-                                    latch_bits, ['Element', 'Set', 'Reset', 'Description'],
-                                    burgundy, [0.75, 2, 2, 2.25])
-
-        filtered_settings = filter_settings(main_settings_351S, 'Display Points')
-        display_points = reorg_display(filtered_settings)
-        create_settings_group_table(doc, 'Display Points', 5, std_tbl_style, std_tbl_pg_align, False,
-                                    display_points, ['Element', 'Logic', 'Set Message', 'Clear Message', 'Description'],
-                                    burgundy, [0.75, 1.33, 1.33, 1.33, 2.25])
-        # Save the document
-        save_path = filedialog.asksaveasfilename(title="Save file as",
-                                                 defaultextension=".docx",
-                                                 filetypes=[("Word documents", "*.docx"), ("All files", "*.*")]
-                                                 )
-        doc.save(save_path)
-
-    # Close workbook and quit app
+        tables = read_report_tables(wb)
+        # Only the relay list: the report's own settings table comes from REPORT_SHEET
+        params = RELAY_TYPES[relay_type]['params']
+        relay_class_rng = wb.read_table(params['sheet_name'], params['class_table'])
+    finally:
+        wb.close()
+    relays = [relay for relay in relay_class_rng[1:] if relay[0] is not None]
+    if relay_ids is not None:
+        relay_ids = set(relay_ids)
+        relays = [relay for relay in relays if relay[0] in relay_ids]
+
+    if not has_class_columns(tables['settings_351S']):
+        print(f"Warning: settings_351S on {REPORT_SHEET} has no {' or '.join(REPORT_CLASS_COLUMNS)} column, "
+              f"so every {per} report holds the same settings")
+
+    # Relays of one class share a report: same settings class and logic class token
+    reports = {}  # file name stem: (heading name, member relays)
+    for relay in relays:
+        if per == 'relay':
+            reports[relay[0]] = (relay[0], [relay])
+        else:
+            logic_token = str(relay[2]).split('.')[0] if relay[2] is not None else None
+            reports.setdefault(f"class_{relay[1]}_{logic_token}",
+                               (f"Class {relay[1]} / Logic {logic_token}", []))[1].append(relay)
+
+    os.makedirs(output_path, exist_ok=True)
+    template = ReportTemplate(template_path)
+    results = []
+    for name, (heading, members) in reports.items():
+        save_path = os.path.join(output_path, report_file_name(name))
+        print(f"Writing report {name}...")
+        try:
+            template.render(save_path, tables, heading, relay_report_settings(tables['settings_351S'], members[0]))
+            results.append({'name': name, 'relays': [relay[0] for relay in members], 'path': save_path,
+                            'error': None})
+        except Exception as e:
+            print(f"Error writing report {name}: {e}")
+            results.append({'name': name, 'relays': [relay[0] for relay in members], 'path': None,
+                            'error': str(e)})
+    print(f"{len(results)} reports written to {output_path}")
+    return results
+
+
+def gen_351S(template_path=DEFAULT_TEMPLATE):
+    """Interactive single report: asks for the workbook and the save location"""
+    import tkinter as tk
+    from tkinter import filedialog
+
+    root = tk.Tk()
+    root.withdraw()
+    xl_path = filedialog.askopenfilename(title="Select a file")
+    wb = open_relay_workbook(xl_path)
+    try:
+        tables = read_report_tables(wb)
     finally:
         wb.close()
-        app.quit()
-
 
-gen_351S()
\ No newline at end of file
+    # Create a Word document
+    doc = Document(template_path)
+    build_report(doc, tables)
+
+    # Save the document
+    save_path = filedialog.asksaveasfilename(title="Save file as",
+                                             defaultextension=".docx",
+                                             filetypes=[("Word documents", "*.docx"), ("All files", "*.*")]
+                                             )
+    doc.save(save_path)
+    return save_path
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Write a Word settings report per relay or relay class, "
+                                                 "without any dialogs.")
+    parser.add_argument('workbook', help="settings workbook (.xlsx/.xlsm, or .xls with Excel installed)")
+    parser.add_argument('output', help="folder for the reports")
+    parser.add_argument('--template', required=True, help="base .docx the reports are built on")
+    parser.add_argument('--type', default='feeder', choices=REPORT_RELAY_TYPES,
+                        help="relay type whose class table lists the relays")
+    parser.add_argument('--per', choices=REPORT_MODES, default='relay', help="one report per relay or per class")
+    parser.add_argument('--relay', action='append', metavar='RID',
+                        help="report only this relay, or with --per class its class (repeatable)")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), help="workbook reader (default: by file extension)")
+    parser.add_argument('--table-cache', metavar='DIR', nargs='?', const=DEFAULT_CACHE_DIR,
+                        help="cache decoded workbook tables in DIR (default: %(const)s)")
+    return parser
+
+
+if __name__ == '__main__':
+    # No arguments: the interactive single report; otherwise the headless batch (see --help)
+    if len(sys.argv) == 1:
+        gen_351S()
+    else:
+        args = build_parser().parse_args()
+        results = gen_reports(args.workbook, args.template, args.output, args.type, args.per, args.backend,
+                              args.table_cache, args.relay)
+        sys.exit(1 if any(result['error'] for result in results) else 0)
@@ -0,0 +1,446 @@
+"""
+Workbook readers for the settings generator.
+
+Every backend exposes the same small interface:
+    read_table(sheet_name, table_name) -> list of rows (header row first)
+    read_tables(sheet_name, table_names) -> {table_name: list of rows}
+    iter_table(sheet_name, table_name) -> iterator over the rows (header row first)
+    close()
+
+The rows match what xlwings returns for `sheet.tables[name].range.value`:
+numbers are floats, empty cells are None, booleans are bools and
+date-formatted cells are datetimes.
+
+Backends:
+    'xlsx'    - pure-Python reader for .xlsx/.xlsm files, no Excel process required
+    'xlwings' - drives a hidden Excel instance (needs Excel and the xlwings package)
+"""
+import datetime
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+# --- XML Namespaces ---
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+XLSX_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Built-in number formats that Excel renders as dates/times
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _tag(name, ns=NS_MAIN):
+    return f'{{{ns}}}{name}'
+
+
+def split_cell_ref(ref):
+    """'AB12' -> (12, 28). Rows and columns are 1-based."""
+    match = _CELL_REF.match(ref.replace('$', '').upper())
+    if not match:
+        raise ValueError(f"Invalid cell reference: {ref}")
+    letters, digits = match.groups()
+    col = 0
+    for char in letters:
+        col = col * 26 + (ord(char) - ord('A') + 1)
+    return int(digits), col
+
+
+def split_range_ref(ref):
+    """'A1:K50' -> (first_row, first_col, last_row, last_col)."""
+    if ':' in ref:
+        start, end = ref.split(':')
+    else:
+        start = end = ref
+    first_row, first_col = split_cell_ref(start)
+    last_row, last_col = split_cell_ref(end)
+    return first_row, first_col, last_row, last_col
+
+
+def _is_date_format(format_code):
+    # Strip quoted literals and bracketed sections ([Red], [$-409]) before looking for date tokens
+    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', '', format_code).lower()
+    return any(token in code for token in ('d', 'm', 'y', 'h', 's'))
+
+
+def _string_item_text(si):
+    """Text of an <si>/<is> element. Rich text is split over <r><t> runs; phonetic hints (<rPh>) are skipped."""
+    text = []
+    for child in si:
+        if child.tag == _tag('t'):
+            text.append(child.text or '')
+        elif child.tag == _tag('r'):
+            t = child.find(_tag('t'))
+            if t is not None:
+                text.append(t.text or '')
+    return ''.join(text)
+
+
+class SharedString(int):
+    """Index into xl/sharedStrings.xml, resolved after the table range has been scanned."""
+
+
+class XlsxWorkbook:
+    """Reads Excel tables straight from the .xlsx zip package."""
+
+    def __init__(self, xl_path):
+        self.xl_path = xl_path
+        self._zip = zipfile.ZipFile(xl_path)
+        self._names = set(self._zip.namelist())
+        self._shared_strings = {}
+        self._shared_string_chunks = None
+        self._shared_string_root = None
+        self._shared_string_stream = None
+        self._date_styles = None
+
+        self._workbook_part = self._find_workbook_part()
+        workbook_xml = ET.fromstring(self._zip.read(self._workbook_part))
+        pr = workbook_xml.find(_tag('workbookPr'))
+        self._date1904 = pr is not None and pr.get('date1904') in ('1', 'true')
+        self._sheet_paths = self._read_sheet_paths(workbook_xml)
+
+    # --- Package helpers ---
+    def _read_rels(self, part):
+        """Returns {rel_id: (type, absolute_target)} for the given package part."""
+        base_dir, file_name = posixpath.split(part)
+        rels_path = posixpath.join(base_dir, '_rels', file_name + '.rels')
+        if rels_path not in self._names:
+            return {}
+        rels = {}
+        for rel in ET.fromstring(self._zip.read(rels_path)).iter(_tag('Relationship', NS_PKG_REL)):
+            target = rel.get('Target')
+            if rel.get('TargetMode') == 'External':
+                continue
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(base_dir, target))
+            rels[rel.get('Id')] = (rel.get('Type', '').rsplit('/', 1)[-1], target)
+        return rels
+
+    def _find_workbook_part(self):
+        for rel_type, target in self._read_rels('').values():
+            if rel_type == 'officeDocument':
+                return target
+        return 'xl/workbook.xml'
+
+    def _read_sheet_paths(self, workbook_xml):
+        rels = self._read_rels(self._workbook_part)
+        sheet_paths = {}
+        for sheet in workbook_xml.iter(_tag('sheet')):
+            rel_id = sheet.get(_tag('id', NS_REL))
+            if rel_id in rels:
+                sheet_paths[sheet.get('name')] = rels[rel_id][1]
+        return sheet_paths
+
+    def _read_root_attrs(self, part):
+        """Attributes of a part's root element, without parsing the rest of it (e.g. a table's column list)."""
+        with self._zip.open(part) as f:
+            for _, elem in ET.iterparse(f, events=('start',)):
+                return dict(elem.attrib)
+        return {}
+
+    def _find_table(self, sheet_name, table_name):
+        """Returns (sheet_path, table_ref) for a named table on the given sheet."""
+        if sheet_name not in self._sheet_paths:
+            raise KeyError(f"Sheet '{sheet_name}' not found in {os.path.basename(self.xl_path)}")
+        sheet_path = self._sheet_paths[sheet_name]
+
+        for rel_type, target in self._read_rels(sheet_path).values():
+            if rel_type != 'table':
+                continue
+            table_attrs = self._read_root_attrs(target)
+            if table_name in (table_attrs.get('name'), table_attrs.get('displayName')):
+                return sheet_path, table_attrs.get('ref')
+
+        raise KeyError(f"Table '{table_name}' not found on sheet '{sheet_name}'")
+
+    # --- Cell value decoding ---
+    def _get_shared_strings(self, indices, cache=True):
+        """
+        Returns {index: text} for the requested shared string indices.
+        cache=False leaves split-path results out of the per-workbook cache (used when streaming a table).
+
+        Excel writes one unprefixed <si> per string, so the part is split on '</si>' and
+        only the requested items are parsed. Files with other markup fall back to
+        stream-parsing the part up to the highest index requested.
+        """
+        if self._shared_string_chunks is None:
+            self._shared_string_chunks = []
+            if 'xl/sharedStrings.xml' in self._names:
+                data = self._zip.read('xl/sharedStrings.xml')
+                root = re.search(rb'<sst\b[^>]*>', data)
+                if root and b'<si>' in data[:root.end() + 16] and b'<si/>' not in data:
+                    self._shared_string_root = root.group(0)
+                    self._shared_string_chunks = data.split(b'</si>')
+                else:
+                    self._shared_string_stream = self._iter_shared_strings()
+                    self._shared_string_chunks = False
+
+        result = {}
+        for idx in indices:
+            if idx not in self._shared_strings:
+                if self._shared_string_chunks:
+                    chunk = self._shared_string_chunks[idx]
+                    xml = self._shared_string_root + chunk[chunk.find(b'<si'):] + b'</si></sst>'
+                    text = _string_item_text(ET.fromstring(xml)[0])
+                    if not cache:
+                        result[idx] = text
+                        continue
+                    self._shared_strings[idx] = text
+                else:
+                    self._stream_shared_strings(idx)
+            result[idx] = self._shared_strings.get(idx)
+        return result
+
+    def _stream_shared_strings(self, idx):
+        while idx not in self._shared_strings and self._shared_string_stream is not None:
+            try:
+                self._shared_strings[len(self._shared_strings)] = next(self._shared_string_stream)
+            except StopIteration:
+                self._shared_string_stream = None
+
+    def _iter_shared_strings(self):
+        with self._zip.open('xl/sharedStrings.xml') as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag == _tag('si'):
+                    yield _string_item_text(elem)
+                    elem.clear()
+
+    def _get_date_styles(self):
+        if self._date_styles is None:
+            self._date_styles = set()
+            if 'xl/styles.xml' in self._names:
+                custom_dates = set()
+                in_cell_xfs = False
+                xf_idx = 0
+                with self._zip.open('xl/styles.xml') as f:
+                    # <numFmts> precedes <cellXfs>; nothing after <cellXfs> is needed
+                    for event, elem in ET.iterparse(f, events=('start', 'end')):
+                        if elem.tag == _tag('cellXfs'):
+                            if event == 'end':
+                                break
+                            in_cell_xfs = True
+                        elif event != 'end':
+                            continue
+                        elif elem.tag == _tag('numFmt'):
+                            if _is_date_format(elem.get('formatCode', '')):
+                                custom_dates.add(int(elem.get('numFmtId')))
+                        elif elem.tag == _tag('xf') and in_cell_xfs:
+                            fmt_id = int(elem.get('numFmtId', 0))
+                            if fmt_id in BUILTIN_DATE_FORMATS or fmt_id in custom_dates:
+                                self._date_styles.add(xf_idx)
+                            xf_idx += 1
+        return self._date_styles
+
+    def _to_datetime(self, serial):
+        epoch = datetime.datetime(1904, 1, 1) if self._date1904 else datetime.datetime(1899, 12, 30)
+        return epoch + datetime.timedelta(days=serial)
+
+    def _cell_value(self, cell):
+        """
+        Decodes a <c> element. Shared strings are returned as a SharedString index
+        so the caller can resolve them in one batch once the needed range is known.
+        """
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            inline = cell.find(_tag('is'))
+            return _string_item_text(inline) if inline is not None else None
+
+        v = cell.find(_tag('v'))
+        if v is None or v.text is None:
+            return None
+        text = v.text
+
+        if cell_type == 's':
+            return SharedString(text)
+        if cell_type == 'str':
+            return text
+        if cell_type == 'b':
+            return text == '1'
+        if cell_type == 'e':
+            return None  # Excel errors (#N/A, #REF!) read as empty, same as xlwings
+
+        number = float(text)
+        style = cell.get('s')
+        if style is not None and int(style) in self._get_date_styles():
+            return self._to_datetime(number)
+        return number
+
+    def _iter_sheet_rows(self, sheet_path, first_row, last_row):
+        """
+        Stream-parses a worksheet, yielding (row_number, <row> element) for rows inside
+        [first_row, last_row]. Parsing stops as soon as the last row has been seen.
+        """
+        with self._zip.open(sheet_path) as f:
+            row_num = 0
+            sheet_data = None
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == _tag('sheetData'):
+                        sheet_data = elem
+                    continue
+                if elem.tag != _tag('row'):
+                    continue
+                row_num = int(elem.get('r', row_num + 1))
+                if row_num > last_row:
+                    break
+                if row_num >= first_row:
+                    yield row_num, elem
+                # Drop the finished row from the tree so memory stays flat on long sheets
+                if sheet_data is not None:
+                    sheet_data.clear()
+                else:
+                    elem.clear()
+
+    # --- Public API ---
+    def read_table(self, sheet_name, table_name):
+        """Reads only the table's `ref` range from its sheet."""
+        return self.read_tables(sheet_name, [table_name])[table_name]
+
+    def read_tables(self, sheet_name, table_names):
+        """
+        Reads several tables from one sheet in a single streaming pass over the rows they span.
+        Returns {table_name: rows}.
+        """
+        bounds = {}
+        sheet_path = None
+        for table_name in table_names:
+            sheet_path, ref = self._find_table(sheet_name, table_name)
+            bounds[table_name] = split_range_ref(ref)
+        tables = {
+            name: [[None] * (last_col - first_col + 1) for _ in range(last_row - first_row + 1)]
+            for name, (first_row, first_col, last_row, last_col) in bounds.items()
+        }
+        if not bounds:
+            return tables
+
+        scan_first = min(b[0] for b in bounds.values())
+        scan_last = max(b[2] for b in bounds.values())
+        shared = []  # (table_name, row_idx, col_idx, string_index)
+        for row_num, row in self._iter_sheet_rows(sheet_path, scan_first, scan_last):
+            in_row = [(name, b) for name, b in bounds.items() if b[0] <= row_num <= b[2]]
+            if not in_row:
+                continue
+            col_num = 0
+            for cell in row.iter(_tag('c')):
+                cell_ref = cell.get('r')
+                col_num = split_cell_ref(cell_ref)[1] if cell_ref else col_num + 1
+                value = None
+                decoded = False
+                for name, (first_row, first_col, last_row, last_col) in in_row:
+                    if col_num < first_col or col_num > last_col:
+                        continue
+                    if not decoded:
+                        value = self._cell_value(cell)
+                        decoded = True
+                    if isinstance(value, SharedString):
+                        shared.append((name, row_num - first_row, col_num - first_col, int(value)))
+                    else:
+                        tables[name][row_num - first_row][col_num - first_col] = value
+
+        if shared:
+            strings = self._get_shared_strings({idx for _, _, _, idx in shared})
+            for name, r, c, idx in shared:
+                tables[name][r][c] = strings[idx]
+        return tables
+
+    def iter_table(self, sheet_name, table_name):
+        """
+        Yields a table's rows one at a time, streaming its sheet, so memory does not grow with the table.
+        Shared strings are resolved row by row.
+        """
+        sheet_path, ref = self._find_table(sheet_name, table_name)
+        first_row, first_col, last_row, last_col = split_range_ref(ref)
+        expected_row = first_row
+        for row_num, row in self._iter_sheet_rows(sheet_path, first_row, last_row):
+            while expected_row < row_num:  # rows with no cells are left out of the sheet XML
+                yield [None] * (last_col - first_col + 1)
+                expected_row += 1
+            values = [None] * (last_col - first_col + 1)
+            col_num = 0
+            for cell in row.iter(_tag('c')):
+                cell_ref = cell.get('r')
+                col_num = split_cell_ref(cell_ref)[1] if cell_ref else col_num + 1
+                if first_col <= col_num <= last_col:
+                    values[col_num - first_col] = self._cell_value(cell)
+            shared = {int(value) for value in values if isinstance(value, SharedString)}
+            if shared:
+                strings = self._get_shared_strings(shared, cache=False)
+                values = [strings[int(value)] if isinstance(value, SharedString) else value for value in values]
+            yield values
+            expected_row += 1
+        while expected_row <= last_row:
+            yield [None] * (last_col - first_col + 1)
+            expected_row += 1
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class XlwingsWorkbook:
+    """Reads Excel tables through a hidden Excel instance."""
+
+    def __init__(self, xl_path):
+        import xlwings as xw
+
+        self.xl_path = xl_path
+        self._app = xw.App(visible=False)
+        try:
+            self._wb = self._app.books.open(xl_path)
+        except Exception:
+            self._app.quit()
+            raise
+
+    def read_table(self, sheet_name, table_name):
+        return self._wb.sheets[sheet_name].tables[table_name].range.value
+
+    def read_tables(self, sheet_name, table_names):
+        sheet = self._wb.sheets[sheet_name]
+        return {table_name: sheet.tables[table_name].range.value for table_name in table_names}
+
+    def iter_table(self, sheet_name, table_name):
+        # Excel already holds the whole workbook; one range read is the cheapest way through COM
+        yield from self.read_table(sheet_name, table_name)
+
+    def close(self):
+        try:
+            self._wb.close()
+        finally:
+            self._app.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+BACKENDS = {
+    'xlsx': XlsxWorkbook,
+    'xlwings': XlwingsWorkbook,
+}
+
+
+def open_workbook(xl_path, backend=None):
+    """
+    Opens a workbook with the requested backend.
+    With backend=None, .xlsx/.xlsm files use the pure-Python reader and
+    anything else (e.g. legacy .xls) falls back to xlwings.
+    """
+    if backend is None:
+        backend = 'xlsx' if xl_path.lower().endswith(XLSX_EXTENSIONS) else 'xlwings'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown workbook backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](xl_path)